@@ -0,0 +1,190 @@
+import fcntl
+import gzip
+import heapq
+import json
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from category_crawler import FetchApi, fetch_api
+from category_snapshot import SNAPSHOT_DIR
+
+AUTOCOMPLETE_PATH = os.environ.get("AUTOCOMPLETE_PATH", os.path.join(SNAPSHOT_DIR, "allcategories.json"))
+SAVE_DELAY = float(os.environ.get("AUTOCOMPLETE_SAVE_DELAY", 5))  # seconds; fetches in between are saved together
+SUGGESTIONS = 10
+
+Known = Dict[str, Optional[str]]
+
+
+def normalize_prefix(prefix: str) -> str:
+    # MediaWiki titles use spaces and an upper-case first letter; the rest is case-sensitive
+    prefix = prefix.replace("_", " ").strip()
+    return prefix[:1].upper() + prefix[1:]
+
+
+def _merge_known(a: Known, b: Known) -> Known:
+    # Both runs are known once their titles are merged, so the longer one wins; None is "all of it"
+    merged = dict(a)
+    for prefix, last in b.items():
+        if prefix not in merged:
+            merged[prefix] = last
+        elif merged[prefix] is not None:
+            merged[prefix] = None if last is None else max(merged[prefix], last)
+    return merged
+
+
+# --------- Category Autocomplete ---------
+class CategoryAutocomplete:
+    """Category-name suggestions from a sorted array of known titles.
+
+    Titles come from a dump (``load_dump``) or pile up from ``allcategories``
+    calls. Alongside them, ``known`` maps each prefix that has been fetched
+    to how far its alphabetical run is known: None for "all of it", else
+    the last title the API returned before cutting off. A prefix is
+    answered with a binary search when a fetched prefix of it (or it
+    itself) covers the answer; only other prefixes fall back to the API,
+    which fetches a full page so the next keystrokes are covered too.
+
+    Lookups never lock: a fetch merges its page into a new sorted list and
+    swaps it in. Changes are saved to ``path`` at most every ``save_delay``
+    seconds, off the request path, merged with whatever other processes
+    saved there in the meantime.
+    """
+
+    def __init__(self, path: Optional[str] = AUTOCOMPLETE_PATH, fetch: FetchApi = fetch_api, save_delay: float = SAVE_DELAY):
+        self.path = path
+        self.fetch = fetch
+        self.save_delay = save_delay
+        self._titles: List[str] = []
+        self._present: Set[str] = set()
+        self._known: Known = {}
+        self._lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        if path:
+            self._titles, self._known = self._read()
+            self._present = set(self._titles)
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    # --- Public API ---
+    def suggest(self, prefix: str, limit: int = SUGGESTIONS) -> List[str]:
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        titles = self._local(prefix, limit)
+        if self._covers(prefix, titles, limit):
+            return titles
+        try:
+            self._fetch(prefix)
+        except Exception:
+            # Offline or rate-limited: what is known locally beats nothing
+            return titles
+        return self._local(prefix, limit)
+
+    def load_dump(self, path: str) -> int:
+        """Adds every title from a category title dump (one per line, e.g. ``all-titles-in-ns-14``)."""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            titles = {line.rstrip("\n").replace("_", " ") for line in f}
+        titles.discard("")
+        titles.discard("page title")  # the dump's header line
+        # A full dump lists every category, so every prefix is covered
+        self._merge(titles, {"": None})
+        self.save()
+        return len(titles)
+
+    def save(self) -> None:
+        """Writes pending changes now instead of after ``save_delay``."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self._save()
+
+    # --- Lookups ---
+    def _local(self, prefix: str, limit: int) -> List[str]:
+        titles = self._titles
+        found = []
+        i = bisect_left(titles, prefix)
+        while i < len(titles) and len(found) < limit and titles[i].startswith(prefix):
+            found.append(titles[i])
+            i += 1
+        return found
+
+    def _covers(self, prefix: str, titles: List[str], limit: int) -> bool:
+        known = self._known
+        for end in range(len(prefix) + 1):
+            if prefix[:end] not in known:
+                continue
+            last = known[prefix[:end]]
+            if last is None:
+                return True
+            if len(titles) == limit:
+                # The answer lies inside the known run
+                if titles[-1] <= last:
+                    return True
+            elif last > prefix and not last.startswith(prefix):
+                # The known run goes past every title starting with the prefix
+                return True
+        return False
+
+    # --- Fetching ---
+    def _fetch(self, prefix: str) -> None:
+        data = self.fetch({"action": "query", "list": "allcategories", "acprefix": prefix, "aclimit": "max"})
+        titles = [c["*"] for c in data.get("query", {}).get("allcategories", [])]
+        more = "continue" in data
+        self._merge(titles, {prefix: titles[-1] if more and titles else None})
+        self._schedule_save()
+
+    def _merge(self, titles: Iterable[str], known: Known) -> None:
+        # The merged list is built aside and swapped in, so lookups see the old or the new one
+        with self._lock:
+            new = sorted(set(titles) - self._present)
+            if new:
+                self._present.update(new)
+                self._titles = list(heapq.merge(self._titles, new))
+            self._known = _merge_known(self._known, known)
+
+    # --- Storage ---
+    def _schedule_save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self._save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Serialises read-merge-write between processes sharing the file
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _read(self) -> Tuple[List[str], Known]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return [], {}
+        return data["titles"], data["known"]
+
+    def _save(self) -> None:
+        with self._lock:
+            self._save_timer = None
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._locked():
+            # Pick up what other processes saved, so none of them loses its fetches
+            titles, known = self._read()
+            self._merge(titles, known)
+            with self._lock:
+                titles, known = self._titles, dict(self._known)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"titles": titles, "known": known}, f)
+            os.replace(self.path + ".tmp", self.path)
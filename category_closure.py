@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+import wikiclient
+
+SPARQL_URL = "https://query.wikidata.org/sparql"
+MAX_CLASSES = 50000
+MAX_MEMBERS = 20000
+
+# fetch_sparql(query) -> decoded application/sparql-results+json
+FetchSparql = Callable[[str], Dict[str, Any]]
+
+
+def fetch_sparql(query: str) -> Dict[str, Any]:
+    # WDQS queries may run for up to a minute
+    r = wikiclient.get(SPARQL_URL, params={"query": query}, headers={"Accept": "application/sparql-results+json"}, timeout=(5, 60))
+    r.raise_for_status()
+    return r.json()
+
+
+def _qids(data: Dict[str, Any], var: str) -> Set[str]:
+    prefix = "http://www.wikidata.org/entity/"
+    return {
+        row[var]["value"][len(prefix):]
+        for row in data.get("results", {}).get("bindings", [])
+        if row.get(var, {}).get("value", "").startswith(prefix)
+    }
+
+
+# --------- Category Closure ---------
+class CategoryClosure:
+    """Everything that is a ``cat_qid``, precomputed into in-memory sets.
+
+    ``classes`` is the transitive subclass closure (wdt:P279*, including the
+    category itself) and ``members`` the items that are an instance of any of
+    them, up to ``max_members`` (0 = skip). Both are built by a background
+    thread with one SPARQL query each. A set that hit its size limit (or whose
+    query failed) is incomplete: a hit in it is still a match, but a miss
+    means "don't know" rather than "no". ``failed_at`` (when a query failed,
+    else None) tells a failed build from a size limit, so a cached closure
+    can be built again once the query has had time to recover.
+    """
+
+    def __init__(
+        self,
+        cat_qid: str,
+        fetch: FetchSparql = fetch_sparql,
+        max_classes: int = MAX_CLASSES,
+        max_members: int = MAX_MEMBERS,
+    ):
+        self.cat_qid = cat_qid
+        self.fetch = fetch
+        self.max_classes = max_classes
+        self.max_members = max_members
+        self.classes: Set[str] = set()
+        self.members: Set[str] = set()
+        self.classes_complete = False
+        self.members_complete = False
+        self.failed_at: Optional[float] = None
+        self.ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CategoryClosure":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._build, name=f"closure-{self.cat_qid}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _build(self) -> None:
+        try:
+            # LIMIT one past the cap tells a full result from a truncated one
+            classes = _qids(self.fetch(
+                f"SELECT ?c WHERE {{ ?c wdt:P279* wd:{self.cat_qid} . }} LIMIT {self.max_classes + 1}"
+            ), "c")
+            self.classes = classes | {self.cat_qid}
+            self.classes_complete = len(classes) <= self.max_classes
+            if self.max_members:
+                members = _qids(self.fetch(
+                    f"SELECT ?item WHERE {{ ?item wdt:P31/wdt:P279* wd:{self.cat_qid} . }} LIMIT {self.max_members + 1}"
+                ), "item")
+                self.members = members
+                self.members_complete = len(members) <= self.max_members
+        except Exception:
+            # Whatever was built so far is kept; callers fall back to live checks for the rest
+            self.failed_at = time.time()
+        finally:
+            self.ready.set()
+
+    # --- Lookups ---
+    def has_member(self, qid: str) -> bool:
+        return qid in self.members
+
+    def any_class(self, class_ids: Iterable[str]) -> Optional[bool]:
+        """Whether any of ``class_ids`` is a subclass of (or is) the category; None if unknown yet."""
+        if any(c in self.classes for c in class_ids):
+            return True
+        return False if self.ready.is_set() and self.classes_complete else None
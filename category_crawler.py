@@ -0,0 +1,177 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import wikiclient
+
+WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
+CRAWL_DEPTH = int(os.environ.get("CRAWL_DEPTH", 2))  # subcategory levels below the chosen category
+CRAWL_MAX_MEMBERS = int(os.environ.get("CRAWL_MAX_MEMBERS", 50000))
+CRAWL_MAX_CATEGORIES = int(os.environ.get("CRAWL_MAX_CATEGORIES", 200))
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS", 8))
+
+# fetch(params) -> decoded JSON from the Wikipedia action API
+FetchApi = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def fetch_api(params: Dict[str, Any]) -> Dict[str, Any]:
+    r = wikiclient.get(WIKIPEDIA_API, params=dict(params, format="json"))
+    r.raise_for_status()
+    return r.json()
+
+
+def category_members(
+    fetch: FetchApi,
+    category: str,
+    cmtype: str,
+    since: Optional[str] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Pages of {title, timestamp} members, oldest addition first, following cmcontinue."""
+    params = {
+        "action": "query",
+        "list": "categorymembers",
+        "cmtitle": f"Category:{category}",
+        "cmtype": cmtype,
+        "cmprop": "title|timestamp",
+        "cmsort": "timestamp",
+        "cmdir": "newer",
+        "cmlimit": "max",
+    }
+    if since:
+        params["cmstart"] = since
+    while True:
+        data = fetch(params)
+        yield data.get("query", {}).get("categorymembers", [])
+        cmcontinue = data.get("continue", {}).get("cmcontinue")
+        if not cmcontinue:
+            return
+        params["cmcontinue"] = cmcontinue
+
+
+@dataclass
+class CrawlProgress:
+    categories_done: int = 0
+    categories_seen: int = 0
+    members: int = 0
+    depth: int = 0
+    max_members: int = 0
+
+    @property
+    def fraction(self) -> float:
+        # The tree's size isn't known up front, so this is whichever budget is closer to done
+        by_categories = self.categories_done / max(1, self.categories_seen)
+        by_members = self.members / self.max_members if self.max_members else 0.0
+        return min(1.0, max(by_categories, by_members))
+
+
+@dataclass
+class CrawlResult:
+    root: str
+    tree: Dict[str, List[str]] = field(default_factory=dict)  # category -> subcategories taken
+    depths: Dict[str, int] = field(default_factory=dict)
+    titles: Set[str] = field(default_factory=set)
+    # Newest member timestamp of each category that was read to the end
+    latest: Dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+
+
+class _MemberBudget:
+    # Members read so far across all tasks (pages may overlap, so this runs a little high)
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.spent = threading.Event()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def spend(self, n: int) -> None:
+        with self._lock:
+            self._count += n
+            if self.limit and self._count >= self.limit:
+                self.spent.set()
+
+
+# --------- Crawler ---------
+class CategoryCrawler:
+    """Breadth-first crawl of a category's subcategory tree, several categories at a time.
+
+    Each category is one task on a thread pool: read its member pages and,
+    above ``max_depth``, its subcategories. Subcategories already seen are
+    skipped, so cycles in the category graph end the walk instead of looping.
+    The crawl stops taking on work once ``max_categories`` categories or
+    ``max_members`` members are reached. Members are counted as pages
+    arrive, so tasks still reading stop at the next page, and the result is
+    marked truncated. ``progress`` is called on the crawling thread after
+    every finished category, so it can update UI elements directly.
+    """
+
+    def __init__(
+        self,
+        fetch: FetchApi = fetch_api,
+        max_depth: int = CRAWL_DEPTH,
+        max_members: int = CRAWL_MAX_MEMBERS,
+        max_categories: int = CRAWL_MAX_CATEGORIES,
+        workers: int = CRAWL_WORKERS,
+    ):
+        self.fetch = fetch
+        self.max_depth = max_depth
+        self.max_members = max_members
+        self.max_categories = max_categories
+        self.workers = workers
+
+    def crawl(self, root: str, progress: Optional[Callable[[CrawlProgress], None]] = None) -> CrawlResult:
+        result = CrawlResult(root)
+        stats = CrawlProgress(categories_seen=1, max_members=self.max_members)
+        budget = _MemberBudget(self.max_members)
+        seen = {root}
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="crawl") as pool:
+            pending: Dict[Future, Tuple[str, int]] = {pool.submit(self._visit, root, 0, budget): (root, 0)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    category, depth = pending.pop(future)
+                    titles, latest, complete, subcats = future.result()
+                    result.depths[category] = depth
+                    result.titles.update(titles)
+                    if complete and latest:
+                        result.latest[category] = latest
+                    if not complete:
+                        result.truncated = True
+                    taken = []
+                    for sub in subcats:
+                        if sub in seen:
+                            continue
+                        if budget.spent.is_set() or len(seen) >= self.max_categories:
+                            result.truncated = True
+                            break
+                        seen.add(sub)
+                        taken.append(sub)
+                        pending[pool.submit(self._visit, sub, depth + 1, budget)] = (sub, depth + 1)
+                    result.tree[category] = taken
+                    stats.categories_done += 1
+                    stats.categories_seen = len(seen)
+                    stats.members = len(result.titles)
+                    stats.depth = max(stats.depth, depth)
+                    if progress is not None:
+                        progress(stats)
+        return result
+
+    def _visit(self, category: str, depth: int, budget: _MemberBudget) -> Tuple[Set[str], str, bool, List[str]]:
+        titles: Set[str] = set()
+        latest = ""
+        complete = True
+        for page in category_members(self.fetch, category, "page"):
+            for member in page:
+                titles.add(member["title"])
+                latest = max(latest, member["timestamp"])
+            budget.spend(len(page))
+            if budget.spent.is_set():
+                complete = False
+                break
+        subcats: List[str] = []
+        if depth < self.max_depth and not budget.spent.is_set():
+            for page in category_members(self.fetch, category, "subcat"):
+                subcats += [m["title"].split(":", 1)[1] for m in page]
+        return titles, latest, complete, subcats
+
@@ -0,0 +1,192 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from array import array
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from category_crawler import CategoryCrawler, CrawlProgress, category_members
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "category_snapshots")
+REFRESH_AGE = float(os.environ.get("SNAPSHOT_REFRESH_AGE", 3600))  # pick up newly added members
+FULL_REFRESH_AGE = float(os.environ.get("SNAPSHOT_FULL_REFRESH_AGE", 7 * 24 * 3600))  # recrawl, dropping removed ones
+
+
+def normalize_title(title: str) -> str:
+    # "Ada_Lovelace", " ada  lovelace" and "ADA LOVELACE" are the same guess
+    title = unicodedata.normalize("NFC", title).replace("_", " ")
+    return re.sub(r"\s+", " ", title).strip().casefold()
+
+
+def title_hash(title: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalize_title(title).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# --------- Snapshots ---------
+class CategorySnapshot:
+    """Membership of one category (and its crawled subcategories), loaded from disk.
+
+    Membership is checked against a set of 64-bit hashes of normalised titles,
+    so ``in`` is O(1) however big the category. The titles themselves are only
+    read when ``titles`` is first used.
+    """
+
+    def __init__(self, meta: Dict[str, Any], hashes: Set[int], titles_path: str):
+        self.meta = meta
+        self.category = meta["category"]
+        self.tree: Dict[str, List[str]] = meta.get("tree", {})
+        self._hashes = hashes
+        self._titles_path = titles_path
+        self._titles: Optional[List[str]] = None
+
+    def __contains__(self, title: str) -> bool:
+        return title_hash(title) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    @property
+    def titles(self) -> List[str]:
+        if self._titles is None:
+            with open(self._titles_path, encoding="utf-8") as f:
+                self._titles = f.read().split("\n") if len(self._hashes) else []
+        return self._titles
+
+
+class SnapshotStore:
+    """On-disk category membership snapshots, shared by every session and process.
+
+    Each snapshot lives under ``root`` as ``<key>.json`` (crawled subcategory
+    tree, per-category newest timestamp, refresh times), ``<key>.titles``
+    (sorted member titles) and ``<key>.hashes`` (their title hashes as packed
+    uint64). A new snapshot is built by ``crawler``. ``load`` serves the files
+    as they are while fresh. After ``refresh_age`` it fetches only the members
+    added since each category's newest timestamp, and after
+    ``full_refresh_age`` it recrawls, which also drops removed members.
+
+    ``<key>.aliases`` keeps the members' redirects, and which members they
+    were fetched for, so a refreshed snapshot only fetches them for new
+    members. They are dropped at each full refresh and fetched again.
+    """
+
+    def __init__(
+        self,
+        root: str = SNAPSHOT_DIR,
+        crawler: Optional[CategoryCrawler] = None,
+        refresh_age: float = REFRESH_AGE,
+        full_refresh_age: float = FULL_REFRESH_AGE,
+    ):
+        self.root = root
+        self.crawler = crawler or CategoryCrawler()
+        self.refresh_age = refresh_age
+        self.full_refresh_age = full_refresh_age
+        os.makedirs(root, exist_ok=True)
+
+    # --- Public API ---
+    def load(self, category: str, progress: Optional[Callable[[CrawlProgress], None]] = None) -> CategorySnapshot:
+        snapshot = self._read(category)
+        if snapshot is not None and time.time() - snapshot.meta["refreshed"] < self.refresh_age:
+            return snapshot
+        return self.refresh(category, progress=progress)
+
+    def refresh(
+        self,
+        category: str,
+        full: bool = False,
+        progress: Optional[Callable[[CrawlProgress], None]] = None,
+    ) -> CategorySnapshot:
+        with self._locked(category):
+            # Another process may have refreshed it while we waited for the lock
+            snapshot = self._read(category)
+            now = time.time()
+            if snapshot is not None and not full and now - snapshot.meta["refreshed"] < self.refresh_age:
+                return snapshot
+            if snapshot is None or full or now - snapshot.meta["full_refreshed"] >= self.full_refresh_age:
+                crawl = self.crawler.crawl(category, progress)
+                titles, latest = crawl.titles, crawl.latest
+                meta = {"category": category, "tree": crawl.tree, "truncated": crawl.truncated, "full_refreshed": now}
+            else:
+                titles, latest = self._fetch_added(snapshot.meta["latest"])
+                titles.update(snapshot.titles)
+                meta = dict(snapshot.meta)
+            meta.update(latest=latest, refreshed=now, count=len(titles))
+            self._write(category, meta, titles)
+            return self._read(category)
+
+    def load_aliases(self, snapshot: CategorySnapshot) -> Tuple[Dict[str, str], Set[str]]:
+        """Saved {redirect: member} for the snapshot's category, and the members they were fetched for."""
+        data = self._read_aliases(snapshot)
+        return data["aliases"], set(data["checked"])
+
+    def save_aliases(self, snapshot: CategorySnapshot, aliases: Dict[str, str], checked: Set[str]) -> None:
+        with self._locked(snapshot.category):
+            # Keep what other processes saved meanwhile
+            data = self._read_aliases(snapshot)
+            data["aliases"].update(aliases)
+            data["checked"] = sorted(checked.union(data["checked"]))
+            path = self._path(snapshot.category, "aliases")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(path + ".tmp", path)
+
+    # --- Fetching ---
+    def _fetch_added(self, latest: Dict[str, str]) -> Tuple[Set[str], Dict[str, str]]:
+        # Categories the crawl stopped partway through have no timestamp and wait for the next recrawl
+        titles: Set[str] = set()
+        latest = dict(latest)
+        for category, since in latest.items():
+            for page in category_members(self.crawler.fetch, category, "page", since):
+                for member in page:
+                    titles.add(member["title"])
+                    latest[category] = max(latest[category], member["timestamp"])
+        return titles, latest
+
+    # --- Storage ---
+    def _path(self, category: str, ext: str) -> str:
+        key = hashlib.sha1(category.strip().encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.root, f"{key}.{ext}")
+
+    @contextmanager
+    def _locked(self, category: str) -> Iterator[None]:
+        with open(self._path(category, "lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _read(self, category: str) -> Optional[CategorySnapshot]:
+        try:
+            with open(self._path(category, "json")) as f:
+                meta = json.load(f)
+            hashes = array("Q")
+            with open(self._path(category, "hashes"), "rb") as f:
+                hashes.frombytes(f.read())
+        except FileNotFoundError:
+            return None
+        return CategorySnapshot(meta, set(hashes), self._path(category, "titles"))
+
+    def _read_aliases(self, snapshot: CategorySnapshot) -> Dict[str, Any]:
+        empty = {"full_refreshed": snapshot.meta["full_refreshed"], "aliases": {}, "checked": []}
+        try:
+            with open(self._path(snapshot.category, "aliases"), encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return empty
+        # Saved before the last full refresh: redirects may have been added or retargeted since
+        return data if data.get("full_refreshed") == snapshot.meta["full_refreshed"] else empty
+
+    def _write(self, category: str, meta: Dict[str, Any], titles: Set[str]) -> None:
+        # Data files first, then the metadata that marks the snapshot as present
+        ordered = sorted(titles)
+        files = [
+            ("titles", "\n".join(ordered).encode("utf-8")),
+            ("hashes", array("Q", sorted({title_hash(t) for t in ordered})).tobytes()),
+            ("json", json.dumps(meta).encode("utf-8")),
+        ]
+        for ext, data in files:
+            path = self._path(category, ext)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
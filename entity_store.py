@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import wikiclient
+
+WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+ENTITY_STORE_PATH = os.environ.get("ENTITY_STORE_PATH", "wikidata_cache.sqlite3")
+ENTITY_TTL = float(os.environ.get("ENTITY_TTL", 7 * 24 * 3600))
+SEARCH_TTL = float(os.environ.get("SEARCH_TTL", 24 * 3600))
+# Replay Wikidata from a recorded fixture instead of the live API (see RecordedWikidata)
+WIKIDATA_FIXTURE = os.environ.get("WIKIDATA_FIXTURE")
+# A few names' searches and claims, for running check() offline
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wikidata_fixture.json")
+
+# Only these properties are kept from an entity's claims
+KEPT_PROPERTIES = ("P31", "P21", "P279")
+# wbgetentities accepts at most 50 ids per call
+MAX_IDS_PER_CALL = 50
+
+# fetch_json(url, params) -> decoded JSON response
+FetchJson = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+
+
+def fetch_json(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    r = wikiclient.get(url, params=params)
+    r.raise_for_status()
+    return r.json()
+
+
+def default_fetch() -> FetchJson:
+    return RecordedWikidata(WIKIDATA_FIXTURE) if WIKIDATA_FIXTURE else fetch_json
+
+
+def trim_claims(claims: Dict[str, Any]) -> Dict[str, List[str]]:
+    """{property: [item ids]} for the kept properties, skipping claims without a value."""
+    trimmed = {}
+    for prop in KEPT_PROPERTIES:
+        ids = []
+        for claim in claims.get(prop, []):
+            value = claim.get("mainsnak", {}).get("datavalue", {}).get("value")
+            if isinstance(value, dict) and value.get("id"):
+                ids.append(value["id"])
+        if ids:
+            trimmed[prop] = ids
+    return trimmed
+
+
+# --------- Entity Store ---------
+class EntityStore:
+    """Disk cache of Wikidata search results and trimmed entity claims.
+
+    Backed by one SQLite file in WAL mode, so every session and worker process
+    on the machine shares it and it survives restarts. Rows older than their
+    TTL are fetched again; entities that don't exist are cached as empty.
+    ``fetch`` does the HTTP calls and can be swapped for a ``RecordedWikidata``;
+    it defaults to one replaying ``WIKIDATA_FIXTURE`` when that is set.
+    """
+
+    def __init__(
+        self,
+        path: str = ENTITY_STORE_PATH,
+        fetch: Optional[FetchJson] = None,
+        entity_ttl: float = ENTITY_TTL,
+        search_ttl: float = SEARCH_TTL,
+    ):
+        self.path = path
+        self.fetch = fetch or default_fetch()
+        self.entity_ttl = entity_ttl
+        self.search_ttl = search_ttl
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS searches ("
+                " query TEXT, language TEXT, type TEXT, results TEXT, fetched REAL,"
+                " PRIMARY KEY (query, language, type))"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS entities (qid TEXT PRIMARY KEY, claims TEXT, fetched REAL)")
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per thread; Streamlit runs each session's script in its own thread
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # --- Search ---
+    def search(self, text: str, language: str = "en", entity_type: str = "item") -> List[Dict[str, str]]:
+        """wbsearchentities hits as {id, label, description}, in the API's order."""
+        query = text.strip()
+        db = self._db()
+        row = db.execute(
+            "SELECT results, fetched FROM searches WHERE query = ? AND language = ? AND type = ?",
+            (query, language, entity_type),
+        ).fetchone()
+        if row is not None and time.time() - row[1] < self.search_ttl:
+            return json.loads(row[0])
+
+        data = self.fetch(WIKIDATA_API, {
+            "action": "wbsearchentities",
+            "search": query,
+            "language": language,
+            "type": entity_type,
+            "format": "json",
+        })
+        results = [
+            {"id": hit["id"], "label": hit.get("label", ""), "description": hit.get("description", "")}
+            for hit in data.get("search", [])
+            if hit.get("id")
+        ]
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                (query, language, entity_type, json.dumps(results), time.time()),
+            )
+        return results
+
+    # --- Entities ---
+    def claims(self, qid: str) -> Dict[str, List[str]]:
+        return self.claims_many([qid])[qid]
+
+    def claims_many(self, qids: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+        """Trimmed claims for each id; cache misses are fetched 50 at a time with wbgetentities."""
+        qids = list(dict.fromkeys(qids))
+        found: Dict[str, Dict[str, List[str]]] = {}
+        db = self._db()
+        cutoff = time.time() - self.entity_ttl
+        for start in range(0, len(qids), 500):
+            chunk = qids[start:start + 500]
+            rows = db.execute(
+                f"SELECT qid, claims FROM entities WHERE fetched >= ? AND qid IN ({','.join('?' * len(chunk))})",
+                (cutoff, *chunk),
+            )
+            found.update((qid, json.loads(claims)) for qid, claims in rows)
+
+        missing = [qid for qid in qids if qid not in found]
+        for start in range(0, len(missing), MAX_IDS_PER_CALL):
+            chunk = missing[start:start + MAX_IDS_PER_CALL]
+            data = self.fetch(WIKIDATA_API, {
+                "action": "wbgetentities",
+                "ids": "|".join(chunk),
+                "props": "claims",
+                "format": "json",
+            })
+            entities = data.get("entities", {})
+            fetched = {qid: trim_claims(entities.get(qid, {}).get("claims", {})) for qid in chunk}
+            now = time.time()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO entities VALUES (?, ?, ?)",
+                    [(qid, json.dumps(claims), now) for qid, claims in fetched.items()],
+                )
+            found.update(fetched)
+        return {qid: found[qid] for qid in qids}
+
+
+# --------- Recorded Fixtures ---------
+class RecordedWikidata:
+    """Stand-in for ``fetch_json`` that answers from a JSON file of recorded responses.
+
+    With ``record=True`` unknown requests are passed to ``fetch`` and the file
+    is rewritten with the new response, so a fixture can be captured once
+    against the live API and replayed offline afterwards. ``calls`` counts the
+    requests made, for checking what the store served from disk.
+    """
+
+    def __init__(self, path: str, record: bool = False, fetch: FetchJson = fetch_json):
+        self.path = path
+        self.record = record
+        self.fetch = fetch
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.responses: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            self.responses = {}
+
+    @staticmethod
+    def key(url: str, params: Dict[str, Any]) -> str:
+        return url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+    def __call__(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        key = self.key(url, params)
+        with self._lock:
+            self.calls.append(dict(params))
+            if key in self.responses:
+                return self.responses[key]
+        if not self.record:
+            raise KeyError(f"No recorded response for {key}")
+        data = self.fetch(url, params)
+        with self._lock:
+            self.responses[key] = data
+            with open(self.path + ".tmp", "w") as f:
+                json.dump(self.responses, f, indent=1, sort_keys=True)
+            os.replace(self.path + ".tmp", self.path)
+        return data
+
+
+def recorded_searches(recorded: RecordedWikidata) -> List[str]:
+    return [call["search"] for call in map(_params, recorded.responses) if call.get("action") == "wbsearchentities"]
+
+
+def _params(key: str) -> Dict[str, str]:
+    # Inverse of RecordedWikidata.key for the simple values the store sends
+    return dict(pair.split("=", 1) for pair in key.split("?", 1)[1].split("&"))
+
+
+def check(fixture: str, names: List[str], record: bool = False) -> bool:
+    """Looks ``names`` up the way the games validate them, against a fixture.
+
+    Passes when each name takes one search and one wbgetentities call per 50
+    hits, and looking them all up again is served from disk without a fetch.
+    Without ``names``, every search recorded in the fixture is checked.
+    """
+    recorded = RecordedWikidata(fixture, record)
+    names = names or recorded_searches(recorded)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EntityStore(os.path.join(tmp, "entities.sqlite3"), recorded)
+        ok = True
+        first = {}
+        for name in names:
+            before = len(recorded.calls)
+            try:
+                hit_ids = [hit["id"] for hit in store.search(name)]
+                first[name] = store.claims_many(hit_ids)
+            except KeyError as e:
+                print(f"FAIL {name}: {e.args[0]}")
+                ok = False
+                continue
+            fetches = len(recorded.calls) - before
+            batched = fetches <= 1 + -(-len(hit_ids) // MAX_IDS_PER_CALL)
+            ok &= batched
+            women = [qid for qid, claims in first[name].items() if {"Q6581072", "Q1052281"} & set(claims.get("P21", []))]
+            print(f"{'ok  ' if batched else 'FAIL'} {name}: {len(hit_ids)} hits, {fetches} fetches, women={women}")
+
+        before = len(recorded.calls)
+        start = time.perf_counter()
+        second = {name: store.claims_many(hit["id"] for hit in store.search(name)) for name in first}
+        elapsed = time.perf_counter() - start
+        cached = second == first and len(recorded.calls) == before
+        print(f"{'ok  ' if cached else 'FAIL'} repeat: {len(recorded.calls) - before} fetches, "
+              f"{elapsed / max(len(first), 1) * 1e6:.0f} us per name")
+    return ok and cached
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the entity store against recorded Wikidata responses")
+    parser.add_argument("names", nargs="*", help="defaults to the searches recorded in the fixture")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="JSON file of recorded responses")
+    parser.add_argument("--record", action="store_true", help="fetch and record responses missing from the fixture")
+    args = parser.parse_args(argv)
+    return 0 if check(args.fixture, args.names, args.record) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from category_crawler import FetchApi, fetch_api
+
+MAX_CANDIDATES = 50  # most trigram-similar keys that get an exact edit distance
+REDIRECT_BATCH = 50  # titles per redirects query, the API's limit
+
+# save(aliases, checked) stores the redirects fetched so far and the titles they cover
+SaveAliases = Callable[[Dict[str, str], Set[str]], None]
+
+
+def fold(text: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a title or guess."""
+    text = unicodedata.normalize("NFKD", text.replace("_", " "))
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"  {key} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def bounded_levenshtein(a: str, b: str, bound: int) -> Optional[int]:
+    """Edit distance between ``a`` and ``b``, or None as soon as it must exceed ``bound``."""
+    if abs(len(a) - len(b)) > bound:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    # Only cells within `bound` of the diagonal can stay within `bound`
+    over = bound + 1
+    previous = [j if j <= bound else over for j in range(len(a) + 1)]
+    for i, cb in enumerate(b, 1):
+        lo, hi = max(1, i - bound), min(len(a), i + bound)
+        current = [over] * (len(a) + 1)
+        if i <= bound:
+            current[0] = i
+        for j in range(lo, hi + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[j - 1] != cb))
+        if min(current[lo - 1:hi + 1]) > bound:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= bound else None
+
+
+def typo_budget(key: str) -> int:
+    # Short names are too easy to hit by accident
+    return 0 if len(key) <= 4 else 1 if len(key) <= 8 else 2
+
+
+def fetch_redirects(titles: Iterable[str], fetch: FetchApi = fetch_api) -> Iterator[Dict[str, str]]:
+    """{redirect title: target title} for Wikipedia pages, one dict per ``REDIRECT_BATCH`` titles (one API batch)."""
+    titles = list(titles)
+    for start in range(0, len(titles), REDIRECT_BATCH):
+        batch = titles[start:start + REDIRECT_BATCH]
+        params = {"action": "query", "prop": "redirects", "titles": "|".join(batch), "rdlimit": "max"}
+        aliases: Dict[str, str] = {}
+        while True:
+            data = fetch(params)
+            for page in data.get("query", {}).get("pages", {}).values():
+                for redirect in page.get("redirects", []):
+                    aliases[redirect["title"]] = page["title"]
+            more = data.get("continue", {}).get("rdcontinue")
+            if not more:
+                break
+            params["rdcontinue"] = more
+        yield aliases
+
+
+# --------- Match Index ---------
+class MatchIndex:
+    """Resolves player guesses to member titles without touching the network.
+
+    Every title, its form without a trailing "(disambiguator)", and each alias
+    (e.g. a redirect) is folded and stored as a key. Exact folded matches are a
+    dict lookup. Everything else goes through a trigram index bucketed by key
+    length: only keys of a reachable length that share enough trigrams to be
+    within the typo budget get a bounded edit distance, and the nearest win.
+
+    ``start_aliases`` fetches the redirects of every title not in ``checked``
+    in a background thread (50 per API call, so minutes for a large category)
+    and adds them as they arrive; lookups work throughout and pick them up as
+    they land. ``aliases`` and ``checked`` hold everything known so far, to
+    be saved and passed to the next index over the same titles.
+    """
+
+    def __init__(self, titles: Iterable[str], aliases: Optional[Dict[str, str]] = None, checked: Iterable[str] = ()):
+        self._members = list(titles)
+        self.aliases: Dict[str, str] = {}
+        self.checked: Set[str] = set(checked)
+        self._titles: Dict[str, str] = {}
+        self._keys: List[str] = []
+        self._postings: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.aliases_ready = threading.Event()
+        for title in self._members:
+            self._add(title, title)
+            base = re.sub(r"\s*\([^)]*\)$", "", title)
+            if base != title:
+                self._add(base, title)
+        self.add_aliases(aliases or {})
+
+    def _add(self, name: str, title: str) -> None:
+        # Readers don't lock: a key is in _keys before any posting refers to it
+        key = fold(name)
+        if not key or key in self._titles:
+            return
+        key_id = len(self._keys)
+        self._keys.append(key)
+        self._titles[key] = title
+        for gram in _trigrams(key):
+            self._postings[gram, len(key)].append(key_id)
+
+    def add_aliases(self, aliases: Dict[str, str]) -> None:
+        with self._lock:
+            self.aliases.update(aliases)
+            for alias, title in aliases.items():
+                self._add(alias, title)
+
+    def start_aliases(self, fetch: FetchApi = fetch_api, save: Optional[SaveAliases] = None) -> "MatchIndex":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._fetch_aliases, args=(fetch, save), name="match-aliases", daemon=True)
+            self._thread.start()
+        return self
+
+    def _fetch_aliases(self, fetch: FetchApi, save: Optional[SaveAliases]) -> None:
+        pending = [title for title in self._members if title not in self.checked]
+        try:
+            for start, aliases in zip(range(0, len(pending), REDIRECT_BATCH), fetch_redirects(pending, fetch)):
+                self.add_aliases(aliases)
+                with self._lock:
+                    self.checked.update(pending[start:start + REDIRECT_BATCH])
+        except Exception:
+            # Titles and the aliases fetched so far keep working
+            pass
+        finally:
+            self.aliases_ready.set()
+        if save is not None and pending:
+            with self._lock:
+                aliases, checked = dict(self.aliases), set(self.checked)
+            try:
+                save(aliases, checked)
+            except Exception:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # --- Lookups ---
+    def lookup(self, guess: str) -> Optional[str]:
+        """The member title a guess names exactly (up to case, accents and punctuation), if any."""
+        return self._titles.get(fold(guess))
+
+    def nearest(self, guess: str, max_distance: Optional[int] = None, limit: int = 5) -> List[Tuple[str, int]]:
+        """Up to ``limit`` (title, edit distance) pairs within ``max_distance``, closest first."""
+        key = fold(guess)
+        if not key:
+            return []
+        if key in self._titles:
+            return [(self._titles[key], 0)]
+        bound = typo_budget(key) if max_distance is None else max_distance
+        lengths = range(max(1, len(key) - bound), len(key) + bound + 1)
+        postings = [[self._postings.get((gram, n), ()) for n in lengths] for gram in _trigrams(key)]
+        postings.sort(key=lambda lists: sum(map(len, lists)))
+        # Each edit touches at most three trigrams, so a key within `bound` edits shares
+        # all but 3 * bound of the guess's trigrams. The most common ones are the slowest
+        # to count, so half of the rest are skipped and the bar lowered to match.
+        skip = max(0, len(postings) - 3 * bound - 1) // 2
+        needed = len(postings) - 3 * bound - skip
+        shared = Counter()
+        for lists in postings[:len(postings) - skip]:
+            for ids in lists:
+                shared.update(ids)
+        candidates = heapq.nlargest(
+            MAX_CANDIDATES, (key_id for key_id, count in shared.items() if count >= needed), key=shared.__getitem__
+        )
+        found: Dict[str, int] = {}
+        for key_id in candidates:
+            candidate = self._keys[key_id]
+            distance = bounded_levenshtein(key, candidate, bound)
+            if distance is not None:
+                title = self._titles[candidate]
+                found[title] = min(distance, found.get(title, distance))
+        return sorted(found.items(), key=lambda item: (item[1], item[0]))[:limit]
+
+    def match(self, guess: str) -> Optional[str]:
+        """The title a guess names, allowing a few typos when only one title is that close."""
+        nearest = self.nearest(guess, limit=2)
+        if not nearest:
+            return None
+        if len(nearest) > 1 and nearest[1][1] == nearest[0][1]:
+            return None
+        return nearest[0][0]
+
+    def suggest(self, guess: str, limit: int = 5) -> List[str]:
+        """Near misses to offer back to the player, allowing one more typo than ``match`` does."""
+        return [title for title, _ in self.nearest(guess, typo_budget(fold(guess)) + 1, limit)]
@@ -1,8 +1,9 @@
 import streamlit as st
 import time
-import requests
 import pandas as pd
+import requests
 from datetime import datetime
+from entity_store import EntityStore
 
 # App state
 if 'started' not in st.session_state:
@@ -14,27 +15,28 @@ if 'started' not in st.session_state:
     st.session_state.times_up = False
     st.session_state.entered_names = set()
 
+# Wikidata searches and claims are cached on disk, shared by every session
+@st.cache_resource
+def get_entity_store():
+    return EntityStore()
+
 # Function to validate name with Wikidata and check if they are women
 @st.cache_data(show_spinner=False)
 def validate_name(name):
     if not name.strip():
         return False
-    url = f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={name}&language=en&format=json"
-    r = requests.get(url)
-    if r.status_code == 200:
-        results = r.json().get('search', [])
-        for result in results:
-            qid = result.get('id')
-            if qid:
-                entity_url = f"https://www.wikidata.org/wiki/Special:EntityData/{qid}.json"
-                entity_data = requests.get(entity_url).json()
-                claims = entity_data['entities'][qid]['claims']
-                # P21 is 'sex or gender'; include cis and trans women
-                if 'P21' in claims:
-                    for gender_claim in claims['P21']:
-                        gender_id = gender_claim['mainsnak']['datavalue']['value']['id']
-                        if gender_id in ['Q6581072', 'Q1052281']:  # female or transgender female
-                            return True
+    store = get_entity_store()
+    try:
+        # One wbgetentities call for every search hit
+        entities = store.claims_many([result['id'] for result in store.search(name)])
+    except (requests.RequestException, KeyError):
+        # Wikidata unreachable even after retries (or no recorded response): not a match
+        return False
+    for claims in entities.values():
+        # P21 is 'sex or gender'; include cis and trans women
+        for gender_id in claims.get('P21', []):
+            if gender_id in ['Q6581072', 'Q1052281']:  # female or transgender female
+                return True
     return False
 
 # Leaderboard
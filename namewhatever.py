@@ -1,16 +1,30 @@
 # Streamlined Streamlit Naming Challenge Game
 import streamlit as st
 import time
-import requests
+import wikiclient
 import pandas as pd
 from datetime import datetime
 import os
 import re
 import inflect
 import time as systime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from category_closure import CategoryClosure
+from entity_store import EntityStore
+from match_index import fold
 
 p = inflect.engine()
 
+# Subclass checks for one guess run side by side; the first match wins
+SUBCLASS_CHECK_WORKERS = 8
+# Closures hold up to ~70k QIDs each; rebuilt hourly to pick up Wikidata edits
+CLOSURE_CACHE_ENTRIES = 16
+CLOSURE_CACHE_TTL = 3600
+# A failed closure is kept (guesses fall back to live checks) this long before the
+# heavy WDQS queries are tried again, so a category that always times out isn't retried per guess
+CLOSURE_RETRY_DELAY = 600
+
 # --- App State --- #
 if 'started' not in st.session_state:
     st.session_state.update({
@@ -27,20 +41,38 @@ if 'started' not in st.session_state:
     })
 
 # --- Utilities --- #
+# inflect is slow and every rerun normalizes the current guess again
+@lru_cache(maxsize=4096)
 def normalize(text):
     return p.singular_noun(text.lower().strip()) or text.lower().strip()
 
 def is_valid_email(email):
     return re.match(r"[^@]+@[^@]+\.[^@]+", email)
 
+# Wikidata searches and claims are cached on disk, shared by every session
+@st.cache_resource
+def get_entity_store():
+    return EntityStore()
+
+@st.cache_resource
+def get_subclass_pool():
+    return ThreadPoolExecutor(SUBCLASS_CHECK_WORKERS, thread_name_prefix="subclass")
+
+# A closure whose build failed is dropped once CLOSURE_RETRY_DELAY has passed, so it gets built again
+def closure_usable(closure):
+    return closure.failed_at is None or time.time() - closure.failed_at < CLOSURE_RETRY_DELAY
+
+# Subclass closure (and members) of a category, built in the background and shared by every session
+@st.cache_resource(show_spinner=False, max_entries=CLOSURE_CACHE_ENTRIES, ttl=CLOSURE_CACHE_TTL, validate=closure_usable)
+def get_category_closure(cat_qid):
+    return CategoryClosure(cat_qid).start()
+
 @st.cache_data(show_spinner=False)
 def get_category_qid(category):
     try:
-        r = requests.get(f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={category}&language=en&format=json&type=item")
-        if r.ok and r.text.strip():
-            for item in r.json().get('search', []):
-                if item.get('id') and 'disambiguation' not in item.get('description', '').lower():
-                    return item['id']
+        for item in get_entity_store().search(category):
+            if 'disambiguation' not in item['description'].lower():
+                return item['id']
     except:
         pass
     return None
@@ -49,37 +81,47 @@ def get_category_qid(category):
 def check_subclass_or_equal(child_id, parent_id):
     try:
         query = f"""ASK {{ wd:{child_id} wdt:P279* wd:{parent_id} . }}"""
-        r = requests.get("https://query.wikidata.org/sparql", params={"query": query}, headers={"Accept": "application/sparql-results+json"})
+        r = wikiclient.get("https://query.wikidata.org/sparql", params={"query": query}, headers={"Accept": "application/sparql-results+json"})
         return r.ok and r.json().get("boolean", False)
     except:
         return False
 
+def any_subclass_or_equal(child_ids, parent_id):
+    # Checks still queued are cancelled once one matches; ones already on the wire finish in the background
+    futures = [get_subclass_pool().submit(check_subclass_or_equal, child_id, parent_id) for child_id in child_ids]
+    try:
+        return any(future.result() for future in as_completed(futures))
+    finally:
+        for future in futures:
+            future.cancel()
+
 @st.cache_data(show_spinner=False)
 def validate_name(name, category, cat_qid):
     if not name or not cat_qid:
         return False
     try:
-        r = requests.get(f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={name}&language=en&format=json")
-        for result in r.json().get("search", []):
-            qid = result.get("id")
-            if not qid:
+        store = get_entity_store()
+        closure = get_category_closure(cat_qid)
+        hit_ids = [result["id"] for result in store.search(name)]
+        if any(closure.has_member(qid) for qid in hit_ids):
+            return True
+        # One wbgetentities call for every search hit
+        entities = store.claims_many(hit_ids)
+        inst_ids = []
+        for claims in entities.values():
+            if 'Q4167410' in claims.get('P31', []):  # disambiguation page
                 continue
-            detail = requests.get(f"https://www.wikidata.org/wiki/Special:EntityData/{qid}.json")
-            claims = detail.json()['entities'][qid].get('claims', {})
-            if 'P31' in claims:
-                if any(c['mainsnak'].get('datavalue', {}).get('value', {}).get('id') == 'Q4167410' for c in claims['P31']):
-                    continue
-                for inst in claims['P31']:
-                    try:
-                        inst_id = inst['mainsnak']['datavalue']['value']['id']
-                        if check_subclass_or_equal(inst_id, cat_qid):
-                            return True
-                    except:
-                        continue
-            if category == 'women' and 'P21' in claims:
-                for g in claims['P21']:
-                    if g['mainsnak']['datavalue']['value']['id'] in ['Q6581072', 'Q1052281']:
-                        return True
+            if category == 'women' and any(g in ['Q6581072', 'Q1052281'] for g in claims.get('P21', [])):
+                return True
+            inst_ids += claims.get('P31', [])
+        inst_ids = list(dict.fromkeys(inst_ids))
+        known = closure.any_class(inst_ids)
+        if known is not None:
+            return known
+        # Closure not built yet (or too large to hold): SPARQL checks, concurrently
+        if cat_qid in inst_ids:
+            return True
+        return any_subclass_or_equal(inst_ids, cat_qid)
     except:
         pass
     return False
@@ -110,6 +152,8 @@ if not st.session_state.started:
         if not st.session_state.cat_qid:
             st.error("Couldn't find a matching category on Wikidata.")
         else:
+            # Starts building the category's subclass closure while the clock runs
+            get_category_closure(st.session_state.cat_qid)
             st.session_state.target_count = count
             st.session_state.names = [""] * count
             st.session_state.current_index = 0
@@ -129,7 +173,8 @@ else:
     name_input = col1.text_input(f"Enter item #{st.session_state.current_index + 1}", key=name_key)
 
     if name_input and st.session_state.current_index < st.session_state.target_count:
-        norm = normalize(name_input)
+        # "Pokémon" and "pokemon!" are the same guess
+        norm = normalize(fold(name_input))
         if norm in st.session_state.entered_names:
             st.warning("Duplicate entry.")
         elif validate_name(name_input, st.session_state.category, st.session_state.cat_qid):
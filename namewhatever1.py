@@ -1,27 +1,18 @@
 import streamlit as st
 import time
-import requests
+import wikiclient
 import pandas as pd
 from datetime import datetime
+from category_autocomplete import CategoryAutocomplete
 
 # --- Utilities ---
-@st.cache_data(show_spinner=False)
+# Category names already seen are suggested locally; the API is only asked about new prefixes
+@st.cache_resource
+def get_category_autocomplete():
+    return CategoryAutocomplete()
+
 def fetch_category_suggestions(prefix):
-    if not prefix:
-        return []
-    url = "https://en.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "list": "allcategories",
-        "acprefix": prefix,
-        "aclimit": 10,
-        "format": "json"
-    }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        return [c['*'] for c in data.get('query', {}).get('allcategories', [])]
-    return []
+    return get_category_autocomplete().suggest(prefix)
 
 @st.cache_data(show_spinner=False)
 def fetch_subcategories(parent_category):
@@ -39,7 +30,7 @@ def fetch_subcategories(parent_category):
         }
         if cmcontinue:
             params["cmcontinue"] = cmcontinue
-        r = requests.get(url, params=params)
+        r = wikiclient.get(url, params=params)
         if r.status_code != 200:
             break
         data = r.json()
@@ -56,7 +47,7 @@ def fetch_subcategories(parent_category):
         "aclimit": 10,
         "format": "json"
     }
-    response = requests.get(url, params=params)
+    response = wikiclient.get(url, params=params)
     if response.status_code == 200:
         data = response.json()
         return [c['*'] for c in data.get('query', {}).get('allcategories', [])]
@@ -69,7 +60,7 @@ def fetch_subcategories(parent_category):
         "limit": 10,
         "format": "json"
     }
-    response = requests.get(url, params=params)
+    response = wikiclient.get(url, params=params)
     if response.status_code == 200:
         results = response.json()
         return [r.replace("Category:", "") for r in results[1]]
@@ -90,7 +81,7 @@ def fetch_valid_category_members(category):
         }
         if cmcontinue:
             params["cmcontinue"] = cmcontinue
-        r = requests.get(url, params=params)
+        r = wikiclient.get(url, params=params)
         if r.status_code != 200:
             break
         data = r.json()
@@ -105,7 +96,7 @@ def validate_name(name, category):
     if not name.strip():
         return False
     url = f"https://en.wikipedia.org/w/api.php?action=query&prop=categories&format=json&titles={name}"
-    r = requests.get(url)
+    r = wikiclient.get(url)
     if r.status_code == 200:
         pages = r.json().get("query", {}).get("pages", {})
         for page in pages.values():
@@ -115,14 +106,14 @@ def validate_name(name, category):
                     return True
     return False
     url = f"https://www.wikidata.org/w/api.php?action=wbsearchentities&search={name}&language=en&format=json"
-    r = requests.get(url)
+    r = wikiclient.get(url)
     if r.status_code == 200:
         results = r.json().get('search', [])
         for result in results:
             qid = result.get('id')
             if qid:
                 page_url = f"https://en.wikipedia.org/w/api.php?action=query&prop=categories&format=json&titles={name}"
-                resp = requests.get(page_url)
+                resp = wikiclient.get(page_url)
                 if resp.status_code == 200:
                     pages = resp.json().get("query", {}).get("pages", {})
                     for page in pages.values():
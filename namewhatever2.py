@@ -1,27 +1,21 @@
 import streamlit as st
 import time
-import requests
+import wikiclient
+from functools import partial
 import pandas as pd
 from datetime import datetime
+from category_snapshot import SnapshotStore, normalize_title
+from category_autocomplete import CategoryAutocomplete
+from match_index import MatchIndex
 
 # --- Utilities ---
-@st.cache_data(show_spinner=False)
+# Category names already seen are suggested locally; the API is only asked about new prefixes
+@st.cache_resource
+def get_category_autocomplete():
+    return CategoryAutocomplete()
+
 def fetch_category_suggestions(prefix):
-    if not prefix:
-        return []
-    url = "https://en.wikipedia.org/w/api.php"
-    params = {
-        "action": "query",
-        "list": "allcategories",
-        "acprefix": prefix,
-        "aclimit": 10,
-        "format": "json"
-    }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        data = response.json()
-        return [c['*'] for c in data.get('query', {}).get('allcategories', [])]
-    return []
+    return get_category_autocomplete().suggest(prefix)
 
 @st.cache_data(show_spinner=False)
 def fetch_subcategories(parent_category):
@@ -39,7 +33,7 @@ def fetch_subcategories(parent_category):
         }
         if cmcontinue:
             params["cmcontinue"] = cmcontinue
-        r = requests.get(url, params=params)
+        r = wikiclient.get(url, params=params)
         if r.status_code != 200:
             break
         data = r.json()
@@ -49,37 +43,38 @@ def fetch_subcategories(parent_category):
             break
     return subcats
 
-@st.cache_data(show_spinner=False)
+# Category members (with their subcategories' members) snapshotted on disk and refreshed incrementally
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore()
+
 def fetch_valid_category_members(category):
-    url = "https://en.wikipedia.org/w/api.php"
-    members = []
-    cmcontinue = None
-    while True:
-        params = {
-            "action": "query",
-            "list": "categorymembers",
-            "cmtitle": f"Category:{category}",
-            "cmlimit": 500,
-            "format": "json"
-        }
-        if cmcontinue:
-            params["cmcontinue"] = cmcontinue
-        r = requests.get(url, params=params)
-        if r.status_code != 200:
-            break
-        data = r.json()
-        members += [m["title"] for m in data["query"]["categorymembers"] if not m["title"].startswith("Category:")]
-        cmcontinue = data.get("continue", {}).get("cmcontinue")
-        if not cmcontinue:
-            break
-    return members
+    # The first player to pick a category waits for its subcategory tree to be crawled; show how far along it is
+    status = st.empty()
+    def report(p):
+        status.progress(p.fraction, text=f"Collecting names: {p.categories_done}/{p.categories_seen} categories, {p.members} names, depth {p.depth}")
+    try:
+        return get_snapshot_store().load(category, progress=report)
+    except Exception:
+        return None
+    finally:
+        status.empty()
+
+# Built once per snapshot, when the category is picked, and shared by every session playing it;
+# redirects are added in the background afterwards. Guesses never hit the network.
+# Redirects are saved with the snapshot, so a refreshed one only fetches them for new names
+@st.cache_resource(show_spinner="Indexing names...", max_entries=8)
+def get_match_index(category, refreshed, _snapshot):
+    store = get_snapshot_store()
+    aliases, checked = store.load_aliases(_snapshot)
+    return MatchIndex(_snapshot.titles, aliases, checked).start_aliases(save=partial(store.save_aliases, _snapshot))
 
 @st.cache_data(show_spinner=False)
 def validate_name(name, category):
     if not name.strip():
         return False
     url = f"https://en.wikipedia.org/w/api.php?action=query&prop=categories&format=json&titles={name}"
-    r = requests.get(url)
+    r = wikiclient.get(url)
     if r.status_code == 200:
         pages = r.json().get("query", {}).get("pages", {})
         for page in pages.values():
@@ -107,7 +102,7 @@ if 'started' not in st.session_state:
     st.session_state.entered_names = set()
     st.session_state.category = ""
     st.session_state.target_count = 100
-    st.session_state.valid_members = []
+    st.session_state.valid_members = None
 
 leaderboard = load_leaderboard()
 st.set_page_config(page_title="Name by Wikipedia Category", layout="centered")
@@ -146,7 +141,11 @@ if not st.session_state.started:
         if valid_members:
             st.session_state.category = current_category
             st.session_state.valid_members = valid_members
+            # Index now, so building it isn't charged to the player's clock
+            get_match_index(current_category, valid_members.meta["refreshed"], valid_members)
             st.success(f"Selected category: {current_category}")
+            if valid_members.meta.get("truncated"):
+                st.info(f"Large category: using the first {len(valid_members)} names found in it and its subcategories.")
         else:
             st.warning("This category has no valid names. Please choose another.")
 
@@ -169,7 +168,7 @@ else:
         st.session_state.times_up = False
         st.session_state.entered_names = set()
         st.session_state.category = ""
-        st.session_state.valid_members = []
+        st.session_state.valid_members = None
         st.rerun()
 
     st.title(f"Name {st.session_state.target_count} from '{st.session_state.category}'")
@@ -181,10 +180,10 @@ else:
     col2.metric("Time", f"{elapsed_time:.3f} sec")
 
     with st.expander("Names you've already entered"):
-        st.write(list(st.session_state.entered_names))
+        st.write(st.session_state.names[:st.session_state.current_index])
 
     with st.expander("See all possible valid names"):
-        for name in st.session_state.valid_members[:100]:  # only show first 100 for performance
+        for name in st.session_state.valid_members.titles[:100]:  # only show first 100 for performance
             wiki_url = f"https://en.wikipedia.org/wiki/{name.replace(' ', '_')}"
             st.markdown(f"- [{name}]({wiki_url})", unsafe_allow_html=True)
 
@@ -196,17 +195,24 @@ else:
         name_input = st.text_input(f"Enter name #{st.session_state.current_index + 1}", key=name_key)
 
     if name_input and st.session_state.current_index < st.session_state.target_count:
-        if name_input in st.session_state.entered_names:
+        members = st.session_state.valid_members
+        index = get_match_index(st.session_state.category, members.meta["refreshed"], members)
+        title = index.match(name_input)
+        if normalize_title(title or name_input) in st.session_state.entered_names:
             st.warning("You've already entered that name. Try a new one.")
-        elif st.session_state.names[st.session_state.current_index] != name_input:
-            if name_input in st.session_state.valid_members:
-                st.session_state.names[st.session_state.current_index] = name_input
-                st.session_state.entered_names.add(name_input)
+        elif st.session_state.names[st.session_state.current_index] != title:
+            if title:
+                st.session_state.names[st.session_state.current_index] = title
+                st.session_state.entered_names.add(normalize_title(title))
                 st.session_state.current_index += 1
                 st.session_state[f"_focus_name_{st.session_state.current_index}"] = True
                 st.rerun()
             else:
-                st.warning("Name not found in selected category on Wikipedia. Try again.")
+                suggestions = index.suggest(name_input)
+                if suggestions:
+                    st.warning(f"Name not found in selected category on Wikipedia. Did you mean: {', '.join(suggestions)}?")
+                else:
+                    st.warning("Name not found in selected category on Wikipedia. Try again.")
 
     if st.session_state.current_index >= st.session_state.target_count and not st.session_state.times_up:
         final_time = st.session_state.end_time - st.session_state.start_time
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+# --------- Admission Control ---------
+class AdmissionLimiter:
+    """Caps concurrent inference requests and sheds load once too many are waiting.
+
+    Up to ``max_active`` callers hold a slot at once; up to ``max_waiting`` more
+    may wait for one (each at most ``wait_timeout`` seconds). Anyone beyond
+    that is turned away immediately so the caller can answer 503 instead of
+    letting requests pile up behind the model. ``max_active <= 0`` disables
+    the limit.
+    """
+
+    def __init__(self, max_active: int = 0, max_waiting: int = 8, wait_timeout: float = 30.0):
+        self.max_active = max_active
+        self.max_waiting = max(0, max_waiting)
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self._cond:
+            if self.max_active <= 0 or self.active < self.max_active:
+                self.active += 1
+                return True
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            deadline = time.monotonic() + self.wait_timeout
+            try:
+                while self.active >= self.max_active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
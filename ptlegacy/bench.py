@@ -0,0 +1,421 @@
+"""Throughput benchmark for the plate counter service.
+
+Runs /api/process and /api/batch in-process with a stub model that returns
+deterministic synthetic boxes, so no weights, torch or GPU are needed:
+
+    python bench.py --out bench.json
+    python bench.py --out new.json --compare bench.json
+
+Each scenario and resolution runs in a fresh process, so the peak RSS
+reported for it is its own; --in-process runs them all in one process,
+which is quicker but makes that column a running maximum.
+
+The overload scenario instead starts serve.py (gunicorn, one worker) around
+the stub model and sends more concurrent requests than the worker has
+threads; it fails unless some of them are turned away with a 503:
+
+    python bench.py --scenarios overload --resolutions small
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from werkzeug.datastructures import FileStorage
+from werkzeug.test import encode_multipart
+
+RESOLUTIONS = {"small": (480, 640), "medium": (1440, 1920), "large": (3000, 4000)}
+SCENARIOS = ("single", "batch", "concurrent", "overload")
+
+
+# --------- Stub Model ---------
+class _Boxes:
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+
+class _Results:
+    def __init__(self, boxes: _Boxes):
+        self.boxes = boxes
+
+
+class StubModel:
+    """Stands in for YOLO: same predict() surface, boxes derived from the image shape."""
+
+    names = {0: "feature", 1: "feature_many_plates"}
+
+    def __init__(self, path: str = "stub", boxes_per_image: int = 150, cost_ms: float = 0.0):
+        self.path = path
+        self.boxes_per_image = boxes_per_image
+        self.cost_ms = cost_ms
+
+    def predict(self, source, imgsz: int = 640, conf: float = 0.25, verbose: bool = False, **_: Any) -> List[_Results]:
+        images = [source] if isinstance(source, np.ndarray) else list(source)
+        if self.cost_ms:
+            time.sleep(self.cost_ms * len(images) / 1000.0)
+        return [self._detect(img, conf) for img in images]
+
+    def _detect(self, img: np.ndarray, conf: float) -> _Results:
+        h, w = img.shape[:2]
+        rng = np.random.default_rng(h * 100003 + w + int(img[h // 2, w // 2].sum()))
+        n = self.boxes_per_image
+        size = rng.uniform(0.005, 0.03, n) * min(h, w) + 2
+        x1 = rng.uniform(0, w - size)
+        y1 = rng.uniform(0, h - size)
+        xyxy = np.stack([x1, y1, x1 + size, y1 + size], axis=1).astype(np.float32)
+        scores = rng.uniform(0.0, 1.0, n).astype(np.float32)
+        cls = (rng.uniform(0, 1, n) < 0.1).astype(np.float32)
+        keep = scores > conf
+        return _Results(_Boxes(xyxy[keep], scores[keep], cls[keep]))
+
+
+# --------- Synthetic Plates ---------
+def synthetic_plate(height: int, width: int, seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), 40, dtype=np.uint8)
+    center = (width // 2, height // 2)
+    radius = int(min(height, width) * 0.45)
+    cv2.circle(img, center, radius, (200, 190, 170), -1)
+    for _ in range(200):
+        angle, dist = rng.uniform(0, 2 * np.pi), rng.uniform(0, radius * 0.95)
+        x, y = int(center[0] + dist * np.cos(angle)), int(center[1] + dist * np.sin(angle))
+        color = tuple(int(c) for c in rng.integers(60, 255, 3))
+        cv2.circle(img, (x, y), int(rng.integers(2, max(3, radius // 40))), color, -1)
+    noise = rng.integers(0, 12, img.shape, dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", cv2.add(img, noise), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes()
+
+
+# --------- Measurement ---------
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name: str, resolution: str, latencies: List[float], images: int, wall: float, errors: int) -> Dict[str, Any]:
+    lat_ms = np.asarray(latencies) * 1000.0
+    return {
+        "scenario": name,
+        "resolution": resolution,
+        "requests": len(latencies),
+        "images": images,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat_ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 2),
+        "images_per_sec": round(images / wall, 2) if wall else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def timed_post(client, url: str, data: Dict[str, Any]) -> Tuple[float, bool]:
+    start = time.perf_counter()
+    resp = client.post(url, data=data, content_type="multipart/form-data")
+    resp.get_data()
+    return time.perf_counter() - start, resp.status_code == 200
+
+
+def run_single(app, images: List[bytes], requests: int, conf: str) -> Tuple[List[float], int, float]:
+    client = app.test_client()
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for i in range(requests):
+        data = {"image": (io.BytesIO(images[i % len(images)]), f"plate_{i}.jpg"), "confidence": conf}
+        elapsed, ok = timed_post(client, "/api/process", data)
+        latencies.append(elapsed)
+        errors += not ok
+    return latencies, errors, time.perf_counter() - start
+
+
+def run_batch(app, images: List[bytes], requests: int, batch_images: int, conf: str) -> Tuple[List[float], int, float]:
+    client = app.test_client()
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for r in range(requests):
+        files = [
+            (io.BytesIO(images[(r * batch_images + i) % len(images)]), f"plate_{r}_{i}.jpg")
+            for i in range(batch_images)
+        ]
+        elapsed, ok = timed_post(client, "/api/batch", {"images": files, "confidence": conf})
+        latencies.append(elapsed)
+        errors += not ok
+    return latencies, errors, time.perf_counter() - start
+
+
+def run_concurrent(app, images: List[bytes], requests: int, clients: int, conf: str) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(worker_id: int):
+        client = app.test_client()
+        for i in range(worker_id, requests, clients):
+            data = {"image": (io.BytesIO(images[i % len(images)]), f"plate_{i}.jpg"), "confidence": conf}
+            elapsed, ok = timed_post(client, "/api/process", data)
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not ok
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def run_overload(args, images: List[bytes], requests: int, clients: int) -> Tuple[List[float], int, float, int]:
+    # Real server, so gthread's request threads are what bounds concurrency, as in production
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve", str(port),
+           "--boxes", str(args.boxes), "--model-ms", str(max(args.model_ms, 200.0))]
+    server = subprocess.Popen(cmd, env=dict(os.environ, WORKERS="1"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    latencies: List[float] = []
+    counts = {"errors": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def post(i: int) -> Tuple[float, int]:
+        image = FileStorage(io.BytesIO(images[i % len(images)]), filename=f"plate_{i}.jpg", name="image")
+        boundary, body = encode_multipart({"image": image, "confidence": args.confidence})
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        start = time.perf_counter()
+        try:
+            conn.request("POST", "/api/process", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+            resp = conn.getresponse()
+            resp.read()
+            return time.perf_counter() - start, resp.status
+        finally:
+            conn.close()
+
+    def worker(worker_id: int):
+        for i in range(worker_id, requests, clients):
+            elapsed, status = post(i)
+            with lock:
+                latencies.append(elapsed)
+                counts["rejected"] += status == 503
+                counts["errors"] += status not in (200, 503)
+
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", "/api/models")
+                conn.getresponse().read()
+                conn.close()
+                break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("server did not start: " + server.stderr.read().decode(errors="replace")[-2000:])
+                time.sleep(0.2)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return latencies, counts["errors"], wall, counts["rejected"]
+
+
+def serve_stub(args) -> None:
+    # Child process of the overload scenario; admission limits are set up before pt9 reads them
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import serve
+
+    serve.configure_admission()
+    load_app(args)
+    serve.main({"bind": f"127.0.0.1:{args.serve}", "loglevel": "warning"})
+
+
+# --------- Setup ---------
+def load_app(args):
+    # pt9 reads its configuration at import time
+    os.environ.setdefault("JOBS_DIR", tempfile.mkdtemp(prefix="pt9-bench-jobs-"))
+    os.environ.setdefault("REFERENCES_DIR", tempfile.mkdtemp(prefix="pt9-bench-refs-"))
+    os.environ["MODEL_PATHS"] = "stub=stub"
+    os.environ["MODEL_BACKEND"] = "ultralytics"
+    os.environ.pop("DETECTION_CACHE_DIR", None)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import pt9
+    from detection_cache import DetectionCache
+
+    pt9.model_registry.loader = lambda path: StubModel(path, args.boxes, args.model_ms)
+    if not args.cache:
+        # max_bytes=0 keeps nothing, so repeated images are inferred again
+        pt9.detection_cache = DetectionCache(max_bytes=0)
+    return pt9.app
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["resolution"]): r for r in json.load(f)["results"]}
+    print(f"\n{'scenario':<12}{'res':<8}{'p50 Δ%':>10}{'p95 Δ%':>10}{'img/s Δ%':>10}")
+    for r in current:
+        old = baseline.get((r["scenario"], r["resolution"]))
+        if not old:
+            continue
+
+        def delta(key):
+            return f"{100.0 * (r[key] - old[key]) / old[key]:+.1f}" if old[key] else "n/a"
+
+        print(f"{r['scenario']:<12}{r['resolution']:<8}{delta('p50_ms'):>10}{delta('p95_ms'):>10}{delta('images_per_sec'):>10}")
+
+
+def run_scenario(app, args, scenario: str, res_name: str, images: List[bytes]) -> Tuple[Dict[str, Any], Optional[str]]:
+    # Returns the result row and, if the scenario's own check failed, why
+    failure = None
+    if scenario == "single":
+        lat, errors, wall = run_single(app, images, args.requests, args.confidence)
+        n_images = len(lat)
+    elif scenario == "batch":
+        lat, errors, wall = run_batch(app, images, max(1, args.requests // 4), args.batch_images, args.confidence)
+        n_images = len(lat) * args.batch_images
+    elif scenario == "concurrent":
+        lat, errors, wall = run_concurrent(app, images, args.requests, args.clients, args.confidence)
+        n_images = len(lat)
+    else:
+        clients = args.overload_clients
+        lat, errors, wall, rejected = run_overload(args, images, max(args.requests, 2 * clients), clients)
+        n_images = len(lat) - rejected
+        print(f"{'':<20}{rejected} of {len(lat)} requests answered 503")
+        if not rejected:
+            failure = f"overload/{res_name}: no request was turned away with a 503"
+    return summarize(scenario, res_name, lat, n_images, wall, errors), failure
+
+
+def run_isolated(argv: List[str], scenario: str, res_name: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    # ru_maxrss is a high-water mark for the whole process, so each scenario gets
+    # a fresh one for its peak RSS to mean anything
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        cmd = [sys.executable, os.path.abspath(__file__), *argv,
+               "--scenarios", scenario, "--resolutions", res_name, "--child", out.name]
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+        sys.stdout.write(proc.stdout)
+        with open(out.name) as f:
+            text = f.read()
+    if proc.returncode not in (0, 1) or not text:
+        return None, f"{scenario}/{res_name}: benchmark process exited with {proc.returncode}"
+    child = json.loads(text)
+    return child["row"], child["failure"]
+
+
+def print_row(row: Dict[str, Any]) -> None:
+    print(f"{row['scenario']:<12}{row['resolution']:<8}{row['requests']:>6}{row['images']:>6}{row['p50_ms']:>10}"
+          f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['images_per_sec']:>9}{row['peak_rss_mb']:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS), help="comma list of: " + ", ".join(RESOLUTIONS))
+    parser.add_argument("--scenarios", default="single,batch,concurrent", help="comma list of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario and resolution")
+    parser.add_argument("--batch-images", type=int, default=16, help="images per /api/batch request")
+    parser.add_argument("--clients", type=int, default=4, help="threads for the concurrent scenario")
+    parser.add_argument("--overload-clients", type=int, default=24, help="concurrent clients for the overload scenario")
+    parser.add_argument("--distinct-images", type=int, default=8, help="different synthetic plates per resolution")
+    parser.add_argument("--boxes", type=int, default=150, help="stub detections per image before filtering")
+    parser.add_argument("--model-ms", type=float, default=0.0, help="simulated inference cost per image")
+    parser.add_argument("--confidence", default="0.25")
+    parser.add_argument("--cache", action="store_true", help="keep the detection cache enabled")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run every scenario in this process (faster; peak RSS is then cumulative)")
+    parser.add_argument("--out", help="write machine-readable results here")
+    parser.add_argument("--compare", help="previous --out file to diff against")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)  # port; used by the overload scenario
+    parser.add_argument("--child", help=argparse.SUPPRESS)  # result file; one isolated scenario
+    args = parser.parse_args(argv)
+    if args.serve:
+        serve_stub(args)
+        return 0
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    resolutions = [r.strip() for r in args.resolutions.split(",") if r.strip()]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario}")
+    if args.child:
+        app = load_app(args)
+        height, width = RESOLUTIONS[resolutions[0]]
+        images = [synthetic_plate(height, width, seed) for seed in range(args.distinct_images)]
+        row, failure = run_scenario(app, args, scenarios[0], resolutions[0], images)
+        print_row(row)
+        with open(args.child, "w") as f:
+            json.dump({"row": row, "failure": failure}, f)
+        return 1 if failure else 0
+
+    app = load_app(args) if args.in_process else None
+    results = []
+    failed: List[str] = []
+    if args.in_process:
+        print("(rss MB is the peak of this whole run so far, not of each scenario)")
+    print(f"{'scenario':<12}{'res':<8}{'reqs':>6}{'imgs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'img/s':>9}{'rss MB':>9}")
+    for res_name in resolutions:
+        images = None
+        if args.in_process:
+            height, width = RESOLUTIONS[res_name]
+            images = [synthetic_plate(height, width, seed) for seed in range(args.distinct_images)]
+        for scenario in scenarios:
+            if args.in_process:
+                row, failure = run_scenario(app, args, scenario, res_name, images)
+                print_row(row)
+            else:
+                row, failure = run_isolated(list(sys.argv[1:] if argv is None else argv), scenario, res_name)
+            if row is not None:
+                results.append(row)
+            if failure:
+                failed.append(failure)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+            # Otherwise each row's peak RSS is that scenario's own process
+            "peak_rss": "cumulative" if args.in_process else "per scenario",
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    for message in failed:
+        print("FAILED:", message, file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+from typing import Tuple
+
+import numpy as np
+
+
+# --------- Box Utils ---------
+def box_iou_one(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def overlapping_pairs(boxes: np.ndarray, iou_threshold: float, chunk: int = 1 << 20) -> Tuple[np.ndarray, np.ndarray]:
+    """Index pairs ``(a, b)``, ``a != b``, whose IoU is above ``iou_threshold`` (>= 0).
+
+    Such boxes overlap along x, so after sorting by x1 each box is only
+    compared with the boxes that start before it ends. That is a few
+    neighbours for small, scattered boxes instead of all n. The pairs are
+    checked ``chunk`` at a time to bound memory when many boxes overlap.
+    """
+    order = np.argsort(boxes[:, 0], kind="stable")
+    x1 = boxes[order, 0]
+    ends = np.searchsorted(x1, boxes[order, 2], side="left")
+    counts = np.maximum(ends - np.arange(1, len(order) + 1), 0)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    firsts, seconds = [], []
+    pos = 0
+    while pos < len(order):
+        stop = max(pos + 1, int(np.searchsorted(bounds, bounds[pos] + chunk, side="right")) - 1)
+        stop = min(stop, len(order))
+        n = counts[pos:stop]
+        total = int(n.sum())
+        if total:
+            first = np.repeat(np.arange(pos, stop), n)
+            # Each box's run of candidates starts right after it in x order
+            second = first + 1 + np.arange(total) - np.repeat(bounds[pos:stop] - bounds[pos], n)
+            a, b = boxes[order[first]], boxes[order[second]]
+            inter = (
+                np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+                * np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+            )
+            area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+            area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+            hit = inter / np.maximum(area_a + area_b - inter, 1e-9) > iou_threshold
+            firsts.append(order[first[hit]])
+            seconds.append(order[second[hit]])
+        pos = stop
+    if not firsts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float, max_keep: int = 0) -> np.ndarray:
+    # Greedy NMS; returns kept indices, highest score first, stopping after
+    # ``max_keep`` of them (0 = no limit). Only pairs that can suppress each
+    # other are looked at, so the loop is cheap per box.
+    order = np.argsort(-scores, kind="stable")
+    if max_keep and max_keep * 8 < len(order):
+        # Few boxes wanted out of many (a detector's raw anchors): comparing each
+        # kept box with the rest beats finding every overlapping pair up front
+        keep = []
+        while order.size and len(keep) < max_keep:
+            i = order[0]
+            keep.append(i)
+            rest = order[1:]
+            order = rest[box_iou_one(boxes[i], boxes[rest]) <= iou_threshold]
+        return np.asarray(keep, dtype=np.int64)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    a, b = overlapping_pairs(boxes, iou_threshold)
+    # Orient each pair from the higher-scored box to the one it would suppress
+    swap = rank[a] > rank[b]
+    winner, loser = np.where(swap, b, a), np.where(swap, a, b)
+    by_winner = np.argsort(winner, kind="stable")
+    loser = loser[by_winner]
+    starts = np.searchsorted(winner[by_winner], np.arange(len(order) + 1))
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in order.tolist():
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if max_keep and len(keep) >= max_keep:
+            break
+        if starts[i] != starts[i + 1]:
+            suppressed[loser[starts[i]:starts[i + 1]]] = True
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(
+    boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou_threshold: float, max_keep: int = 0
+) -> np.ndarray:
+    # Class-aware NMS: shift each class into its own coordinate range so boxes
+    # of different classes never overlap
+    if boxes.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = classes.astype(boxes.dtype)[:, None] * (boxes.max() + 1)
+    return nms(boxes + offsets, scores, iou_threshold, max_keep)
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+# Raw, unfiltered model output for one image:
+#   {"xyxy": float32 (N, 4), "conf": float32 (N,), "cls": int64 (N,)}
+RawDetections = Dict[str, np.ndarray]
+
+
+# --------- Detection Cache ---------
+class DetectionCache:
+    """LRU cache of raw detections keyed by image content hash.
+
+    The in-memory tier is bounded by the total size of the stored arrays. When
+    ``disk_dir`` is set, every entry is also written there as ``<key>.npz`` and
+    memory misses fall back to it, so results survive restarts and are shared
+    between worker processes. ``max_bytes <= 0`` turns the in-memory tier
+    off (nothing is kept, not even the newest entry).
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, RawDetections]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image_bytes: bytes, *parts: str) -> str:
+        h = hashlib.sha256(image_bytes)
+        for part in parts:
+            h.update(b"\0" + str(part).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[RawDetections]:
+        with self._lock:
+            raw = self._entries.get(key)
+            if raw is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return raw
+
+        raw = self._load(key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, raw)
+        return raw
+
+    def put(self, key: str, raw: RawDetections) -> None:
+        with self._lock:
+            self._insert(key, raw)
+        self._store(key, raw)
+
+    def _insert(self, key: str, raw: RawDetections) -> None:
+        if self.max_bytes <= 0:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= _nbytes(old)
+        self._entries[key] = raw
+        self._bytes += _nbytes(raw)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _nbytes(evicted)
+
+    # --- Disk tier ---
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key + ".npz")
+
+    def _load(self, key: str) -> Optional[RawDetections]:
+        if not self.disk_dir:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return {name: data[name] for name in ("xyxy", "conf", "cls")}
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _store(self, key: str, raw: RawDetections) -> None:
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **raw)
+        os.replace(tmp, path)
+
+
+def _nbytes(raw: RawDetections) -> int:
+    return sum(arr.nbytes for arr in raw.values())
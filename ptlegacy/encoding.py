@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+# --------- Output Formats ---------
+@dataclass(frozen=True)
+class OutputFormat:
+    """How annotated previews are returned.
+
+    ``format`` is ``png``, ``jpeg``, ``webp`` or ``boxes``; ``boxes`` skips the
+    image entirely and leaves drawing to the client. ``max_side`` (0 = off)
+    downscales the preview so its longer side fits, before boxes are drawn.
+    """
+
+    format: str = "png"
+    quality: int = 85
+    max_side: int = 0
+
+    def __post_init__(self):
+        if self.format not in MIME_TYPES and self.format != "boxes":
+            raise ValueError(f"Unknown output format '{self.format}'")
+        if not 1 <= self.quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+
+    @property
+    def renders_image(self) -> bool:
+        return self.format != "boxes"
+
+    @property
+    def mime(self) -> Optional[str]:
+        return MIME_TYPES.get(self.format)
+
+
+def preview_scale(shape: Tuple[int, ...], max_side: int) -> float:
+    longest = max(shape[0], shape[1])
+    return max_side / longest if max_side and longest > max_side else 1.0
+
+
+def downscale(img: np.ndarray, detections: List[Dict[str, Any]], max_side: int) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    scale = preview_scale(img.shape, max_side)
+    if scale == 1.0:
+        return img, detections
+    size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+    small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    scaled = [dict(det, bbox=[v * scale for v in det["bbox"]]) for det in detections]
+    return small, scaled
+
+
+def encode_rgb(img: np.ndarray, output: OutputFormat) -> bytes:
+    # OpenCV's encoders are faster than PIL's and release the GIL while they run
+    if output.format == "jpeg":
+        params = [cv2.IMWRITE_JPEG_QUALITY, output.quality]
+    elif output.format == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, output.quality]
+    elif output.format == "png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    else:
+        raise ValueError(f"Cannot encode an image as '{output.format}'")
+    ok, buf = cv2.imencode("." + output.format, cv2.cvtColor(img, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {output.format}")
+    return buf.tobytes()
@@ -0,0 +1,113 @@
+from typing import Any, BinaryIO, Dict, List, Union
+
+DETECTION_COLUMNS = [
+    ("image_index", "int32"),
+    ("image_name", "string"),
+    ("x1", "int32"),
+    ("y1", "int32"),
+    ("x2", "int32"),
+    ("y2", "int32"),
+    ("confidence", "float32"),
+    ("label", "string"),
+    ("center_x", "int32"),
+    ("center_y", "int32"),
+    ("width", "int32"),
+    ("height", "int32"),
+    ("area", "int64"),
+]
+IMAGE_COLUMNS = [
+    ("image_index", "int32"),
+    ("image_name", "string"),
+    ("total_features", "int32"),
+    ("error", "string"),
+    ("reference_id", "string"),
+    ("reference_name", "string"),
+    ("reference_similarity", "float32"),
+]
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# --------- Parquet Tables ---------
+class _TableWriter:
+    def __init__(self, sink: Union[str, BinaryIO], columns, batch_rows: int, compression: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in columns])
+        self.batch_rows = batch_rows
+        self._writer = pq.ParquetWriter(sink, self.schema, compression=compression)
+        self._columns: Dict[str, List[Any]] = {name: [] for name in self.schema.names}
+        self._rows = 0
+
+    def append(self, values: Dict[str, Any]) -> None:
+        for name, column in self._columns.items():
+            column.append(values.get(name))
+        self._rows += 1
+        if self._rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._rows:
+            return
+        self._writer.write_batch(self._pa.RecordBatch.from_pydict(self._columns, schema=self.schema))
+        for column in self._columns.values():
+            column.clear()
+        self._rows = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+
+class ResultTables:
+    """Writes batch results as two Parquet tables, incrementally.
+
+    ``detections`` has one row per detection (bbox split into x1..y2) and
+    ``images`` one row per image with its count, error and reference match.
+    Rows are buffered and written as a record batch every ``batch_rows`` rows,
+    so memory stays flat however many plates go through. Needs pyarrow.
+    """
+
+    def __init__(
+        self,
+        detections_sink: Union[str, BinaryIO],
+        images_sink: Union[str, BinaryIO],
+        batch_rows: int = 64 * 1024,
+        compression: str = "zstd",
+    ):
+        self.detections = _TableWriter(detections_sink, DETECTION_COLUMNS, batch_rows, compression)
+        self.images = _TableWriter(images_sink, IMAGE_COLUMNS, batch_rows, compression)
+
+    def add(self, index: int, row: Dict[str, Any]) -> None:
+        name = row["image_name"]
+        match = row.get("reference_match") or {}
+        self.images.append({
+            "image_index": index,
+            "image_name": name,
+            "total_features": row.get("total_features"),
+            "error": row.get("error"),
+            "reference_id": match.get("id"),
+            "reference_name": match.get("name"),
+            "reference_similarity": match.get("similarity"),
+        })
+        for det in row.get("detections") or []:
+            x1, y1, x2, y2 = det["bbox"]
+            self.detections.append(dict(det, image_index=index, image_name=name, x1=x1, y1=y1, x2=x2, y2=y2))
+
+    def close(self) -> None:
+        self.detections.close()
+        self.images.close()
+
+    def __enter__(self) -> "ResultTables":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,147 @@
+import mmap
+import tempfile
+import threading
+from typing import BinaryIO, Callable, Iterator, List, Optional, Union
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+# Something np.frombuffer / hashlib can read without copying
+Buffer = Union[bytes, memoryview, mmap.mmap]
+
+
+# --------- Spooled Uploads ---------
+class Upload:
+    """One uploaded file, kept in memory while small and in a temp file after that.
+
+    Once complete, ``data`` exposes the contents without a copy: a memoryview
+    of the in-memory buffer, or an mmap of the temp file. ``close`` frees
+    either and calls ``on_close``.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        filename: str,
+        memory_limit: int,
+        on_close: Optional[Callable[["Upload"], None]] = None,
+    ):
+        self.field = field
+        self.filename = filename
+        self.size = 0
+        self.data: Buffer = b""
+        self._memory_limit = memory_limit
+        self._on_close = on_close
+        self._buf: Optional[bytearray] = bytearray()
+        self._file: Optional[BinaryIO] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self._file is None and self.size > self._memory_limit:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(self._buf)
+            self._buf = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buf += chunk
+
+    def finish(self) -> None:
+        if self._file is None:
+            self.data = memoryview(self._buf)
+        elif self.size:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.data = self._mmap
+
+    def close(self) -> None:
+        self.data = b""
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A decoder still holds a view of it; the mapping goes away with that
+                pass
+        if self._file is not None:
+            self._file.close()
+        self._buf = None
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close(self)
+
+
+# --------- Multipart Ingestion ---------
+class MultipartIngest:
+    """Parses a multipart/form-data body incrementally from the raw request stream.
+
+    ``files()`` yields each file part as soon as its last byte has arrived, so
+    work on the first image can start while later ones are still uploading.
+    Text fields are collected into ``fields`` as they go past, and ``complete``
+    is set once the whole body has been read. ``uploads`` holds the files not
+    closed yet; closing one as soon as it has been used frees its memory
+    before the request ends.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        boundary: bytes,
+        memory_limit: int = 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+        max_form_memory_size: Optional[int] = 500_000,
+        max_parts: Optional[int] = 1000,
+    ):
+        self.stream = stream
+        self.memory_limit = memory_limit
+        self.chunk_size = chunk_size
+        self.fields: MultiDict = MultiDict()
+        self.uploads: List[Upload] = []
+        self.complete = False
+        self._lock = threading.Lock()
+        self._decoder = MultipartDecoder(boundary, max_form_memory_size=max_form_memory_size, max_parts=max_parts)
+
+    def files(self) -> Iterator[Upload]:
+        part = None
+        field_chunks: List[bytes] = []
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            self._decoder.receive_data(chunk or None)
+            event = self._decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, Field):
+                    part, field_chunks = event, []
+                elif isinstance(event, File):
+                    part = Upload(event.name, event.filename, self.memory_limit, on_close=self._forget)
+                    with self._lock:
+                        self.uploads.append(part)
+                elif isinstance(event, Data):
+                    if isinstance(part, Upload):
+                        part.write(event.data)
+                    else:
+                        field_chunks.append(event.data)
+                    if not event.more_data:
+                        if isinstance(part, Upload):
+                            part.finish()
+                            yield part
+                        else:
+                            self.fields.add(part.name, b"".join(field_chunks).decode("utf-8", "replace"))
+                event = self._decoder.next_event()
+            if not chunk or isinstance(event, Epilogue):
+                self.complete = True
+                return
+
+    def read_all(self) -> List[Upload]:
+        return list(self.files())
+
+    def _forget(self, upload: Upload) -> None:
+        # Uploads are closed from pipeline threads while the body is still being parsed
+        with self._lock:
+            if upload in self.uploads:
+                self.uploads.remove(upload)
+
+    def close(self) -> None:
+        with self._lock:
+            uploads = list(self.uploads)
+        for upload in uploads:
+            upload.close()
@@ -0,0 +1,320 @@
+import csv
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# run_fn(items, params) yields one (row, annotated_bytes_or_None) per input, in order
+RunFn = Callable[[Iterable[Tuple[str, bytes]], Dict[str, Any]], Iterator[Tuple[Dict[str, Any], Optional[bytes]]]]
+# finish_fn(job_dir, rows) writes any extra artifacts once a job is done
+FinishFn = Callable[[str, List[Dict[str, Any]]], None]
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _file_name(index: int, name: str) -> str:
+    return f"{index:05d}_" + (_UNSAFE.sub("_", os.path.basename(name or "")) or "image")
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+# --------- Background Jobs ---------
+class JobManager:
+    """Queues plate batches on a worker pool and persists them under ``root``.
+
+    Layout of one job directory::
+
+        job.json        status, progress and parameters
+        inputs/         uploaded images, prefixed with their upload index
+        results.jsonl   one row per finished image, appended as it completes
+        annotated/      annotated image per finished image
+        results.csv, annotated.zip   written when the job is done, plus whatever finish_fn adds
+
+    Jobs that were queued or running when the process stopped are picked up
+    again by ``resume()``, skipping images already recorded in ``results.jsonl``.
+    Only each job's status and counts are kept in memory; result rows are read
+    back from ``results.jsonl`` when asked for. Finished jobs older than
+    ``retention`` seconds (0 = forever) are deleted.
+
+    Several processes may share one ``root``: each runs the jobs it accepted,
+    and jobs owned by another process are re-read from disk on ``get()``.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        run_fn: RunFn,
+        csv_columns: List[str],
+        workers: int = 1,
+        finish_fn: Optional[FinishFn] = None,
+        retention: float = 0.0,
+    ):
+        self.root = root
+        self.run_fn = run_fn
+        self.csv_columns = csv_columns
+        self.finish_fn = finish_fn
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._owned: Set[str] = set()
+        self._stopping = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    # --- Paths ---
+    def job_dir(self, job_id: str) -> str:
+        if not _JOB_ID.match(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.root, job_id)
+
+    def annotated_path(self, job_id: str, index: int) -> Optional[str]:
+        job = self.get(job_id)
+        if job is None or not 0 <= index < job["total"]:
+            return None
+        path = os.path.join(self.job_dir(job_id), "annotated", _file_name(index, job['inputs'][index]))
+        return path if os.path.exists(path) else None
+
+    def artifact_path(self, job_id: str, filename: str) -> Optional[str]:
+        job = self.get(job_id)
+        if job is None or job["status"] != "done":
+            return None
+        path = os.path.join(self.job_dir(job_id), filename)
+        return path if os.path.exists(path) else None
+
+    # --- Public API ---
+    def submit(self, uploads: List[Tuple[str, BinaryIO]], params: Dict[str, Any]) -> str:
+        self.prune()
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        os.makedirs(os.path.join(job_dir, "inputs"))
+        os.makedirs(os.path.join(job_dir, "annotated"))
+        names = []
+        for index, (name, stream) in enumerate(uploads):
+            with open(os.path.join(job_dir, "inputs", _file_name(index, name)), "wb") as out:
+                shutil.copyfileobj(stream, out)
+            names.append(name)
+
+        now = time.time()
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "created": now,
+            "updated": now,
+            "total": len(names),
+            "processed": 0,
+            "params": params,
+            "inputs": names,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._owned.add(job_id)
+            _write_json(os.path.join(job_dir, "job.json"), job)
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._refresh(job_id)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def results(self, job_id: str, since: int = 0) -> List[Dict[str, Any]]:
+        """Rows recorded after the first ``since``, in the order they finished."""
+        try:
+            log = os.path.join(self.job_dir(job_id), "results.jsonl")
+        except KeyError:
+            return []
+        rows: List[Dict[str, Any]] = []
+        try:
+            with open(log, "rb") as f:
+                for number, line in enumerate(f):
+                    if not line.endswith(b"\n"):
+                        break  # still being written
+                    if number >= since:
+                        rows.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        return rows
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        for job_id in os.listdir(self.root):
+            if _JOB_ID.match(job_id):
+                self._refresh(job_id)
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values()]
+        for job in jobs:
+            job.pop("inputs", None)
+        return sorted(jobs, key=lambda j: j["created"], reverse=True)
+
+    def status_counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+    def prune(self) -> None:
+        """Deletes finished jobs not updated for ``retention`` seconds."""
+        if not self.retention:
+            return
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in ("done", "failed") and job["updated"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._owned.discard(job_id)
+        for job_id in expired:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def shutdown(self) -> None:
+        # Stop after the image in flight; interrupted jobs stay queued for resume()
+        self._stopping.set()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    # --- Worker ---
+    def _run(self, job_id: str) -> None:
+        if self._stopping.is_set():
+            return
+        job_dir = self.job_dir(job_id)
+        done = {r["index"] for r in self.results(job_id)}
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            self._save(job)
+
+        pending = [i for i in range(job["total"]) if i not in done]
+
+        def items():
+            for i in pending:
+                path = os.path.join(job_dir, "inputs", _file_name(i, job['inputs'][i]))
+                with open(path, "rb") as f:
+                    yield job["inputs"][i], f.read()
+
+        interrupted = False
+        try:
+            with open(os.path.join(job_dir, "results.jsonl"), "a") as log:
+                for index, (row, annotated) in zip(pending, self.run_fn(items(), job["params"])):
+                    if annotated is not None:
+                        path = os.path.join(job_dir, "annotated", _file_name(index, job['inputs'][index]))
+                        with open(path, "wb") as f:
+                            f.write(annotated)
+                    row = dict(row, index=index)
+                    log.write(json.dumps(row) + "\n")
+                    log.flush()
+                    with self._lock:
+                        job["processed"] += 1
+                        self._save(job)
+                    if self._stopping.is_set():
+                        interrupted = True
+                        break
+            if interrupted:
+                status, error = "queued", None
+            else:
+                self._finish(job_id)
+                status, error = "done", None
+        except Exception as e:
+            status, error = "failed", str(e)
+
+        with self._lock:
+            job["status"] = status
+            job["error"] = error
+            self._save(job)
+
+    def _finish(self, job_id: str) -> None:
+        job_dir = self.job_dir(job_id)
+        rows = sorted(self.results(job_id), key=lambda r: r["index"])
+
+        with open(os.path.join(job_dir, "results.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.csv_columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+        annotated_dir = os.path.join(job_dir, "annotated")
+        tmp = os.path.join(job_dir, "annotated.zip.tmp")
+        with zipfile.ZipFile(tmp, "w") as zf:
+            for row in rows:
+                path = os.path.join(annotated_dir, _file_name(row['index'], row['image_name']))
+                if os.path.exists(path):
+                    zf.write(path, row["image_name"].replace(" ", "_"))
+        os.replace(tmp, os.path.join(job_dir, "annotated.zip"))
+
+        if self.finish_fn is not None:
+            self.finish_fn(job_dir, rows)
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        job["updated"] = time.time()
+        _write_json(os.path.join(self.root, job["id"], "job.json"), job)
+
+    def _read(self, job_id: str, truncate: bool = False) -> Optional[Dict[str, Any]]:
+        meta = os.path.join(self.job_dir(job_id), "job.json")
+        if not os.path.exists(meta):
+            return None
+        with open(meta) as f:
+            job = json.load(f)
+
+        processed = 0
+        log = os.path.join(self.root, job_id, "results.jsonl")
+        if os.path.exists(log):
+            with open(log, "rb+" if truncate else "rb") as f:
+                valid = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    processed += 1
+                    valid += len(line)
+                if truncate:
+                    # Drop a torn last line from a crash; that image is re-run
+                    f.truncate(valid)
+        job["processed"] = processed
+        return job
+
+    def _refresh(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job_id in self._owned or (job is not None and job["status"] in ("done", "failed")):
+                return
+        try:
+            loaded = self._read(job_id)
+        except (KeyError, OSError, ValueError):
+            return
+        if loaded is not None:
+            with self._lock:
+                if job_id not in self._owned:
+                    self._jobs[job_id] = loaded
+
+    def _load(self) -> None:
+        for job_id in sorted(os.listdir(self.root)):
+            if not _JOB_ID.match(job_id):
+                continue
+            job = self._read(job_id, truncate=True)
+            if job is None:
+                continue
+            self._jobs[job_id] = job
+
+            if job["status"] == "running":
+                job["status"] = "queued"
+        self.prune()
+
+    def resume(self) -> None:
+        with self._lock:
+            pending = [job_id for job_id, job in self._jobs.items() if job["status"] == "queued"]
+            self._owned.update(pending)
+        for job_id in pending:
+            self._pool.submit(self._run, job_id)
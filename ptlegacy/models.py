@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class UnknownModelError(KeyError):
+    pass
+
+
+def load_yolo(path: str):
+    # Imported lazily so the app can start (and be imported in tests) without torch
+    from ultralytics import YOLO
+    return YOLO(path)
+
+
+def parse_model_paths(spec: str) -> Dict[str, str]:
+    """Parse ``"name=/path/a.pt,other=/path/b.pt"``; a bare path is named ``default``."""
+    paths: Dict[str, str] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, path = item.partition("=")
+        if not sep:
+            name, path = "default", item
+        paths[name.strip()] = path.strip()
+    return paths
+
+
+# --------- Model Registry ---------
+class ModelRegistry:
+    """Loads models by name on first use and keeps up to ``max_loaded`` of them warm.
+
+    Each model is loaded once even under concurrent first requests, and gets a
+    warm-up inference right after loading. The least recently used model is
+    dropped when a new one would exceed ``max_loaded``.
+    """
+
+    def __init__(
+        self,
+        paths: Dict[str, str],
+        default: Optional[str] = None,
+        max_loaded: int = 2,
+        loader: Callable[[str], Any] = load_yolo,
+        warmup_imgsz: Optional[int] = 640,
+    ):
+        if not paths:
+            raise ValueError("no model paths configured")
+        self.paths = dict(paths)
+        self.default = default if default in self.paths else next(iter(self.paths))
+        self.max_loaded = max(1, max_loaded)
+        self.loader = loader
+        self.warmup_imgsz = warmup_imgsz
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in self.paths}
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        name = name or self.default
+        if name not in self.paths:
+            raise UnknownModelError(f"Unknown model '{name}'")
+        return name
+
+    def path(self, name: Optional[str] = None) -> str:
+        return self.paths[self.resolve(name)]
+
+    def get(self, name: Optional[str] = None, warmup: bool = True):
+        name = self.resolve(name)
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+                return model
+
+        with self._load_locks[name]:
+            with self._lock:
+                model = self._models.get(name)
+            if model is None:
+                model = self.loader(self.paths[name])
+                if warmup:
+                    self._warmup(model)
+            with self._lock:
+                self._models[name] = model
+                self._models.move_to_end(name)
+                while len(self._models) > self.max_loaded:
+                    self._models.popitem(last=False)
+            return model
+
+    def warmup(self, name: Optional[str] = None) -> None:
+        self._warmup(self.get(name, warmup=False))
+
+    def describe(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            loaded = set(self._models)
+        return [
+            {"name": name, "path": path, "loaded": name in loaded, "default": name == self.default}
+            for name, path in self.paths.items()
+        ]
+
+    def _warmup(self, model) -> None:
+        # The first predict builds the graph and allocates buffers; pay it at load time
+        if self.warmup_imgsz:
+            blank = np.zeros((self.warmup_imgsz, self.warmup_imgsz, 3), dtype=np.uint8)
+            model.predict(blank, imgsz=self.warmup_imgsz, verbose=False)
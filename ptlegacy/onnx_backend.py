@@ -0,0 +1,200 @@
+import argparse
+import ast
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from boxes import batched_nms, box_iou_one
+
+
+# --------- Pre/Post Processing ---------
+def letterbox(img: np.ndarray, new_shape: Tuple[int, int], color: int = 114) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    # Same resize + centred padding as ultralytics' LetterBox(auto=False)
+    h, w = img.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (new_shape[1] - new_w) / 2, (new_shape[0] - new_h) / 2
+    if (w, h) != (new_w, new_h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(color, color, color))
+    return img, r, (left, top)
+
+
+def decode_output(
+    pred: np.ndarray,
+    conf_threshold: float,
+    iou_threshold: float,
+    max_det: int,
+    max_nms: int = 30000,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # pred: (4 + num_classes, num_anchors) with boxes as cx, cy, w, h in letterbox pixels
+    pred = pred.T
+    scores = pred[:, 4:]
+    cls = scores.argmax(1)
+    conf = scores[np.arange(len(scores)), cls]
+    keep = conf > np.float32(conf_threshold)
+    pred, conf, cls = pred[keep], conf[keep], cls[keep]
+    if len(pred) > max_nms:
+        top = np.argsort(-conf, kind="stable")[:max_nms]
+        pred, conf, cls = pred[top], conf[top], cls[top]
+
+    cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    xyxy = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+    keep = batched_nms(xyxy, conf, cls, iou_threshold, max_keep=max_det)
+    return xyxy[keep], conf[keep], cls[keep]
+
+
+# --------- Results (duck-typed like ultralytics Results.boxes) ---------
+class _Boxes:
+    def __init__(self, xyxy: np.ndarray, conf: np.ndarray, cls: np.ndarray):
+        self.xyxy = xyxy.astype(np.float32)
+        self.conf = conf.astype(np.float32)
+        self.cls = cls.astype(np.float32)
+
+
+class _Results:
+    def __init__(self, boxes: _Boxes, names: Dict[int, str]):
+        self.boxes = boxes
+        self.names = names
+
+
+# --------- ONNX Runtime Model ---------
+class OnnxYoloModel:
+    """Runs an exported YOLO detection model with ONNX Runtime.
+
+    ``predict`` mirrors the subset of the ultralytics API this app uses: it takes
+    one array or a list of arrays (treated as BGR, exactly like ultralytics)
+    and returns objects with ``boxes.xyxy/conf/cls`` in original image pixels.
+    """
+
+    def __init__(self, path: str, intra_op_threads: int = 0, iou: float = 0.7, max_det: int = 300):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.iou = iou
+        self.max_det = max_det
+
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.static_batch = isinstance(inp.shape[0], int)
+        self.static_hw = tuple(inp.shape[2:4]) if all(isinstance(d, int) for d in inp.shape[2:4]) else None
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {}
+
+    def predict(
+        self,
+        source: Union[np.ndarray, List[np.ndarray]],
+        imgsz: int = 640,
+        conf: float = 0.25,
+        verbose: bool = False,
+        **_: Any,
+    ) -> List[_Results]:
+        images = [source] if isinstance(source, np.ndarray) else list(source)
+        shape = self.static_hw or (imgsz, imgsz)
+        prepared = [letterbox(img, shape) for img in images]
+        # BGR -> RGB, HWC -> CHW, 0..1, as ultralytics' own preprocessing does
+        blobs = [np.ascontiguousarray(p[0][..., ::-1].transpose(2, 0, 1), dtype=np.float32) / 255.0 for p in prepared]
+
+        if self.static_batch:
+            outputs = [self.session.run(None, {self.input_name: blob[None]})[0][0] for blob in blobs]
+        else:
+            outputs = list(self.session.run(None, {self.input_name: np.stack(blobs)})[0])
+
+        results = []
+        for img, (_, gain, (left, top)), pred in zip(images, prepared, outputs):
+            xyxy, scores, cls = decode_output(pred, conf, self.iou, self.max_det)
+            xyxy = (xyxy - np.array([left, top, left, top], dtype=xyxy.dtype)) / gain
+            xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, img.shape[1])
+            xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, img.shape[0])
+            results.append(_Results(_Boxes(xyxy, scores, cls), self.names))
+        return results
+
+
+def onnx_path_for(path: str) -> str:
+    # Let MODEL_PATHS keep pointing at .pt files; the exported .onnx sits next to them
+    root, ext = os.path.splitext(path)
+    return path if ext == ".onnx" else root + ".onnx"
+
+
+def export_onnx(pt_path: str, imgsz: int = 640, dynamic: bool = False) -> str:
+    from ultralytics import YOLO
+
+    return YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=dynamic, simplify=True)
+
+
+# --------- Parity Check ---------
+def _match(a: np.ndarray, b: np.ndarray, iou_threshold: float) -> int:
+    # Greedy one-to-one matching of boxes a against boxes b
+    used = np.zeros(len(b), dtype=bool)
+    matched = 0
+    for box in a:
+        if not len(b):
+            break
+        iou = np.where(used, 0.0, box_iou_one(box, b))
+        j = int(iou.argmax())
+        if iou[j] >= iou_threshold:
+            used[j] = True
+            matched += 1
+    return matched
+
+
+def parity(pt_path: str, onnx_path: str, images: List[str], conf: float, iou_threshold: float, min_recall: float) -> bool:
+    from ultralytics import YOLO
+
+    reference = YOLO(pt_path)
+    candidate = OnnxYoloModel(onnx_path)
+    ok = True
+    for path in images:
+        img = cv2.cvtColor(cv2.imread(path, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        ref = reference.predict(img, imgsz=640, conf=conf, verbose=False)[0].boxes
+        got = candidate.predict(img, imgsz=640, conf=conf)[0].boxes
+        ref_xyxy = ref.xyxy.cpu().numpy()
+        matched = _match(ref_xyxy, got.xyxy, iou_threshold)
+        recall = matched / len(ref_xyxy) if len(ref_xyxy) else 1.0
+        precision = matched / len(got.xyxy) if len(got.xyxy) else 1.0
+        passed = recall >= min_recall and precision >= min_recall
+        ok &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} {path}: ultralytics={len(ref_xyxy)} onnx={len(got.xyxy)} "
+              f"recall={recall:.3f} precision={precision:.3f}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="ONNX Runtime backend for the plate detector")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_export = sub.add_parser("export", help="export a .pt model to .onnx next to it")
+    p_export.add_argument("weights")
+    p_export.add_argument("--imgsz", type=int, default=640)
+    p_export.add_argument("--dynamic", action="store_true", help="dynamic batch/shape (enables batched runs)")
+
+    p_parity = sub.add_parser("parity", help="compare ONNX detections with the ultralytics path")
+    p_parity.add_argument("weights")
+    p_parity.add_argument("images", nargs="+")
+    p_parity.add_argument("--onnx", help="defaults to the .onnx next to the weights")
+    p_parity.add_argument("--conf", type=float, default=0.25)
+    p_parity.add_argument("--iou", type=float, default=0.9, help="IoU for two boxes to count as the same detection")
+    p_parity.add_argument("--min-recall", type=float, default=0.95)
+
+    args = parser.parse_args(argv)
+    if args.cmd == "export":
+        print(export_onnx(args.weights, args.imgsz, args.dynamic))
+        return 0
+    ok = parity(args.weights, args.onnx or onnx_path_for(args.weights), args.images, args.conf, args.iou, args.min_recall)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_DONE = object()
+
+
+@dataclass
+class PipelineResult:
+    index: int
+    name: str
+    detections: List[Dict[str, Any]] = field(default_factory=list)
+    annotated: Optional[bytes] = None
+    error: Optional[str] = None
+    info: Dict[str, Any] = field(default_factory=dict)
+
+
+# --------- Staged Pipeline ---------
+class PlatePipeline:
+    """decode (thread pool) -> batched inference (one thread) -> annotate/encode (thread pool).
+
+    Stages are connected by bounded queues so a slow stage applies backpressure
+    instead of letting decoded images pile up in memory. Results are yielded in
+    upload order.
+    """
+
+    def __init__(
+        self,
+        decode_fn: Callable[[bytes], Any],
+        infer_fn: Callable[[List[Any]], Tuple[List[Any], Dict[str, Any]]],
+        post_fn: Callable[[Any, Any], List[Dict[str, Any]]],
+        render_fn: Callable[[Any, List[Dict[str, Any]]], bytes],
+        batch_size: int = 8,
+        decode_workers: int = 4,
+        render_workers: int = 2,
+        queue_size: int = 16,
+        info_fn: Optional[Callable[[Any, Any], Dict[str, Any]]] = None,
+    ):
+        self.decode_fn = decode_fn
+        self.infer_fn = infer_fn
+        self.post_fn = post_fn
+        self.render_fn = render_fn
+        self.info_fn = info_fn
+        self.batch_size = max(1, batch_size)
+        self.decode_workers = decode_workers
+        self.render_workers = render_workers
+        self.queue_size = max(queue_size, self.batch_size)
+        self.batch_timings: List[Dict[str, Any]] = []
+        self._queues: Dict[str, "queue.Queue"] = {}
+
+    def queue_depths(self) -> Dict[str, int]:
+        # Items waiting between stages right now; empty when the pipeline is not running
+        return {name: q.qsize() for name, q in self._queues.items()}
+
+    def run(self, items: Iterable[Tuple[str, bytes]]) -> Iterator[PipelineResult]:
+        decode_q: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        render_q: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        self._queues = {"decode": decode_q, "render": render_q}
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        decode_pool = ThreadPoolExecutor(self.decode_workers, thread_name_prefix="decode")
+        render_pool = ThreadPoolExecutor(self.render_workers, thread_name_prefix="render")
+
+        def put(q: "queue.Queue", item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q: "queue.Queue"):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def feed():
+            try:
+                for index, (name, data) in enumerate(items):
+                    if not put(decode_q, (index, name, decode_pool.submit(self.decode_fn, data))):
+                        return
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                put(decode_q, _DONE)
+
+        def infer():
+            try:
+                done = False
+                while not done:
+                    # Block for the first entry, then take whatever else is already queued
+                    batch = [get(decode_q)]
+                    while len(batch) < self.batch_size:
+                        try:
+                            batch.append(decode_q.get_nowait())
+                        except queue.Empty:
+                            break
+                    if batch[-1] is _DONE:
+                        batch.pop()
+                        done = True
+                    if batch and not self._infer_batch(batch, render_pool, render_q, put):
+                        return
+                    done = done or stop.is_set()
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                put(render_q, _DONE)
+
+        threads = [
+            threading.Thread(target=feed, name="pipeline-feed", daemon=True),
+            threading.Thread(target=infer, name="pipeline-infer", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = render_q.get()
+                if item is _DONE:
+                    break
+                yield item.result()
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            self._queues = {}
+            decode_pool.shutdown(wait=False, cancel_futures=True)
+            render_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _infer_batch(self, batch, render_pool, render_q, put) -> bool:
+        # Output slots stay in upload order; failed decodes are filled in right away
+        slots: List[Optional[Future]] = []
+        ready = []
+        for index, name, fut in batch:
+            try:
+                ready.append((len(slots), index, name, fut.result()))
+                slots.append(None)
+            except Exception as e:
+                slots.append(_completed(PipelineResult(index, name, error=str(e))))
+
+        if ready:
+            try:
+                raws, timing = self.infer_fn([decoded for _, _, _, decoded in ready])
+            except Exception as e:
+                for slot, index, name, _ in ready:
+                    slots[slot] = _completed(PipelineResult(index, name, error=str(e)))
+            else:
+                timing["batch"] = len(self.batch_timings)
+                self.batch_timings.append(timing)
+                for (slot, index, name, decoded), raw in zip(ready, raws):
+                    slots[slot] = render_pool.submit(self._finish, index, name, decoded, raw)
+
+        for fut in slots:
+            if not put(render_q, fut):
+                return False
+        return True
+
+    def _finish(self, index: int, name: str, decoded, raw) -> PipelineResult:
+        try:
+            detections = self.post_fn(decoded, raw)
+            info = self.info_fn(decoded, raw) if self.info_fn else {}
+            return PipelineResult(index, name, detections, self.render_fn(decoded, detections), info=info)
+        except Exception as e:
+            return PipelineResult(index, name, error=str(e))
+
+
+def _completed(result: PipelineResult) -> Future:
+    fut: Future = Future()
+    fut.set_result(result)
+    return fut
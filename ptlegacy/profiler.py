@@ -0,0 +1,102 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+# --------- Sampling Profiler ---------
+class SamplingProfiler:
+    """Samples the Python stacks of one thread (or every thread) at a fixed interval.
+
+    Stacks are kept as folded lines (``thread;file:func;file:func count``), the
+    input format of flamegraph.pl, speedscope and similar tools. Sampling runs
+    on its own thread, so the profiled code is only slowed by the GIL handoffs.
+    With ``thread_id`` set, only that thread is sampled, plus worker threads
+    while they run work wrapped with ``attach`` (or inside ``attached``), so
+    pool threads are profiled for the request they serve and concurrent
+    requests are left out.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples: Counter = Counter()
+        self.started = 0.0
+        self.duration = 0.0
+        self._threads: Counter = Counter([thread_id] if thread_id is not None else [])
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    # --- Worker threads ---
+    @contextmanager
+    def attached(self) -> Iterator[None]:
+        """Samples the calling thread too until the block exits."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if not self._threads[ident]:
+                    del self._threads[ident]
+
+    def attach(self, fn: Callable[..., T]) -> Callable[..., T]:
+        """``fn``, sampling whichever thread runs it for the duration of each call."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.attached():
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def attach_iter(self, items: Iterable[T]) -> Iterator[T]:
+        # For a generator consumed by one worker thread (e.g. a pipeline's feeder)
+        with self.attached():
+            yield from items
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            with self._lock:
+                threads = set(self._threads)
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.thread_id is not None and ident not in threads):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(" ", "_"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def dump(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
@@ -1,32 +1,144 @@
 import io
 import os
+import csv
+import functools
 import base64
-from typing import List, Dict, Tuple, Any
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+import weakref
+from typing import List, Dict, Tuple, Any, Iterator, Optional
 import cv2
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, has_request_context, request, jsonify, send_file, send_from_directory, stream_with_context
 from PIL import Image, ImageDraw
+from werkzeug.datastructures import CombinedMultiDict
+from werkzeug.exceptions import BadRequest
+from werkzeug.wsgi import ClosingIterator
 import numpy as np
 import pandas as pd
-from ultralytics import YOLO
 import zipfile
 
+from admission import AdmissionLimiter
+from batching import BatchInferenceEngine
+from detection_cache import DetectionCache, RawDetections
+from encoding import OutputFormat, downscale, encode_rgb
+from export import ResultTables, parquet_available
+from ingest import Buffer, MultipartIngest, Upload
+from jobs import JobManager
+from metrics import SIZE_BUCKETS, MetricsRegistry, timed
+from models import ModelRegistry, UnknownModelError, load_yolo, parse_model_paths
+from onnx_backend import OnnxYoloModel, onnx_path_for
+from pipeline import PlatePipeline, PipelineResult
+from profiler import SamplingProfiler
+from references import ReferenceIndex, embed
+from sequence import ChangeGate, count_series, open_frames, summarize
+from tiling import detect_tiled
+from zipstream import stream_zip
+
 # --- Flask App ---
 app = Flask(__name__, static_folder="static", static_url_path="/")
 
-# --- Load YOLO model ---
-MODEL_PATH = "/Users/juicejambouree/Downloads/plate_detection_2/finetune_12plates_2/weights/best.pt"
-yolo_model = YOLO(MODEL_PATH)
+# --- YOLO models (loaded lazily on first use) ---
+# MODEL_PATHS="default=/path/best.pt,other=/path/other.pt" registers several; requests pick one with `model`
+MODEL_PATH = os.environ.get("MODEL_PATH", "/Users/juicejambouree/Downloads/plate_detection_2/finetune_12plates_2/weights/best.pt")
 
-# --- Class names from the YOLO model ---
-CLASS_NAMES = yolo_model.names  # e.g., {0: 'feature', 1: 'feature_many_plates'}
+# MODEL_BACKEND=onnx runs the .onnx exported next to each weights file through ONNX Runtime
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "ultralytics")
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", 0))
 
-# --------- Image Utils ---------
-def pil_to_base64(pil_img: Image.Image, fmt: str = "PNG") -> str:
-    buf = io.BytesIO()
-    pil_img.save(buf, format=fmt)
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
+def load_model(path: str):
+    if MODEL_BACKEND == "onnx":
+        return OnnxYoloModel(onnx_path_for(path), intra_op_threads=ONNX_INTRA_OP_THREADS)
+    return load_yolo(path)
+
+model_registry = ModelRegistry(
+    parse_model_paths(os.environ.get("MODEL_PATHS", MODEL_PATH)),
+    default=os.environ.get("DEFAULT_MODEL"),
+    max_loaded=int(os.environ.get("MODELS_WARM", 2)),
+    loader=load_model,
+    warmup_imgsz=int(os.environ.get("MODEL_WARMUP_IMGSZ", 640)) or None,
+)
+
+# --- Batch inference ---
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 8))
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", 4))
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 16))
+CSV_COLUMNS = ["image_name", "total_features", "detections", "reference_match", "error"]
+# Parquet tables (one row per detection / per image) need pyarrow
+PARQUET_AVAILABLE = parquet_available()
+
+# --- Upload ingestion ---
+# Uploads above this size are spooled to a temp file and memory-mapped
+UPLOAD_MEMORY_LIMIT = int(os.environ.get("UPLOAD_MEMORY_LIMIT", 1024 * 1024))
+PARAM_FIELDS = ("confidence", "batch_size", "model", "tiled", "tile_size", "tile_overlap", "output_format", "quality", "max_side", "parquet")
+
+# --- Detection cache ---
+# Raw boxes are cached at this floor and re-filtered for any higher slider value
+CACHE_MIN_CONF = float(os.environ.get("CACHE_MIN_CONF", 0.001))
+detection_cache = DetectionCache(
+    max_bytes=int(os.environ.get("DETECTION_CACHE_BYTES", 64 * 1024 * 1024)),
+    disk_dir=os.environ.get("DETECTION_CACHE_DIR") or None,
+)
+
+# --- Tiled inference for high-resolution scans ---
+TILE_SIZE = int(os.environ.get("TILE_SIZE", 640))
+TILE_OVERLAP = int(os.environ.get("TILE_OVERLAP", 128))
+TILE_BATCH_SIZE = int(os.environ.get("TILE_BATCH_SIZE", 8))
+
+# --- Reference plates (matched against every processed image) ---
+REFERENCES_DIR = os.environ.get("REFERENCES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "references"))
+reference_index = ReferenceIndex(REFERENCES_DIR)
+
+# --- Annotated image output (png, jpeg, webp, or boxes = JSON only) ---
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "png")
+OUTPUT_QUALITY = int(os.environ.get("OUTPUT_QUALITY", 85))
+PREVIEW_MAX_SIDE = int(os.environ.get("PREVIEW_MAX_SIDE", 0))  # 0 = full resolution
+DEFAULT_OUTPUT = OutputFormat(OUTPUT_FORMAT, OUTPUT_QUALITY, PREVIEW_MAX_SIDE)
+encode_pool = ThreadPoolExecutor(int(os.environ.get("ENCODE_WORKERS", 2)), thread_name_prefix="encode")
+
+# --- Sequence mode (time-lapse video or zip of frames) ---
+# Frames where less than SEQUENCE_DIFF_THRESHOLD of a 256px grayscale thumbnail
+# changed visibly since the last counted frame reuse its count (see ChangeGate)
+SEQUENCE_DIFF_THRESHOLD = float(os.environ.get("SEQUENCE_DIFF_THRESHOLD", 0.0005))
+SEQUENCE_MAX_SKIP = int(os.environ.get("SEQUENCE_MAX_SKIP", 10))  # 0 = never force a re-count
+
+# --- Background jobs ---
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 0))  # 0 = unlimited
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 7 * 24 * 3600))  # seconds finished jobs are kept; 0 = forever
+
+# --- Admission control for inference requests (0 = unlimited) ---
+# Beyond MAX_INFERENCE_REQUESTS running and MAX_WAITING_REQUESTS waiting, requests get a 503
+inference_limiter = AdmissionLimiter(
+    max_active=int(os.environ.get("MAX_INFERENCE_REQUESTS", 0)),
+    max_waiting=int(os.environ.get("MAX_WAITING_REQUESTS", 8)),
+    wait_timeout=float(os.environ.get("ADMISSION_TIMEOUT", 30)),
+)
+
+# --- Metrics (Prometheus text on /metrics) ---
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram("pt9_stage_seconds", "Time spent in each processing stage", ["stage"])
+BATCH_SIZES = metrics.histogram("pt9_inference_batch_size", "Images per model predict call", buckets=SIZE_BUCKETS)
+CACHE_LOOKUPS = metrics.counter("pt9_detection_cache_lookups_total", "Detection cache lookups", ["result"])
+REQUESTS = metrics.counter("pt9_requests_total", "HTTP requests by endpoint and status", ["endpoint", "status"])
+REQUEST_SECONDS = metrics.histogram("pt9_request_seconds", "Time until the response has been sent, streamed bodies included", ["endpoint"])
+IN_PROGRESS = metrics.gauge("pt9_requests_in_progress", "Requests currently being handled")
+REJECTED = metrics.counter("pt9_requests_rejected_total", "Requests turned away with a 503", ["reason"])
+
+# --- Sampling profiler (off unless PROFILE_DIR is set) ---
+# Requests with ?profile=1 always dump folded stacks there; with PROFILE_SLOW_MS
+# every request is sampled and only the ones slower than that are kept
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or None
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
 
+# --------- Image Utils ---------
+@timed(STAGE_SECONDS, stage="annotate")
 def annotate_image_yolo(img: np.ndarray, detections: List[Dict[str, Any]]) -> Image.Image:
     pil = Image.fromarray(img)
     draw = ImageDraw.Draw(pil)
@@ -36,114 +148,521 @@ def annotate_image_yolo(img: np.ndarray, detections: List[Dict[str, Any]]) -> Im
         draw.text((x1, max(0, y1 - 10)), f"{det['label']} {det['confidence']:.2f}", fill=(255, 255, 0))
     return pil
 
-def process_yolo(image_bytes: bytes, conf_threshold: float) -> Tuple[List[Dict[str, Any]], np.ndarray]:
-    arr = np.asarray(bytearray(image_bytes), dtype=np.uint8)
+@timed(STAGE_SECONDS, stage="decode")
+def decode_image(image_bytes: Buffer) -> np.ndarray:
+    arr = np.frombuffer(image_bytes, dtype=np.uint8)
     img_bgr = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+    if img_bgr is None:
+        raise ValueError("Could not decode image")
+    return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+
+encode_preview = timed(STAGE_SECONDS, stage="encode")(encode_rgb)
+
+def render_annotated(img: np.ndarray, detections: List[Dict[str, Any]], output: OutputFormat) -> Optional[bytes]:
+    if not output.renders_image:
+        return None
+    img, detections = downscale(img, detections, output.max_side)
+    return encode_preview(np.asarray(annotate_image_yolo(img, detections)), output)
+
+def decode_keyed(
+    image_bytes: Buffer,
+    model_name: str,
+    tiling: Optional[Tuple[int, int]] = None,
+    conf_threshold: float = 0.0,
+) -> Tuple[str, np.ndarray]:
+    # Tiles are merged at the requested confidence (see predict_tiled), so it is part of their key
+    mode = ("tiled",) + tuple(tiling) + (conf_threshold,) if tiling else (640,)
+    key = DetectionCache.key(image_bytes, MODEL_BACKEND, model_registry.path(model_name), *mode)
+    return key, decode_image(image_bytes)
+
+def boxes_to_arrays(results) -> RawDetections:
+    def to_numpy(t):
+        return t.cpu().numpy() if hasattr(t, "cpu") else np.asarray(t)
+    return {
+        "xyxy": to_numpy(results.boxes.xyxy).astype(np.float32).reshape(-1, 4),
+        "conf": to_numpy(results.boxes.conf).astype(np.float32).reshape(-1),
+        "cls": to_numpy(results.boxes.cls).astype(np.int64).reshape(-1),
+    }
 
-    results = yolo_model.predict(img_rgb, imgsz=640, verbose=False, conf=conf_threshold)[0]
-    detections = []
+def detect_cached(decoded: List[Tuple[Any, ...]], predict_fn) -> Tuple[List[RawDetections], List[int]]:
+    # decoded: (cache key, image, ...) per image
+    # predict_fn(images) -> raw detections at CACHE_MIN_CONF; only cache misses reach it
+    raws = [detection_cache.get(d[0]) for d in decoded]
+    misses = [i for i, raw in enumerate(raws) if raw is None]
+    CACHE_LOOKUPS.inc(len(raws) - len(misses), result="hit")
+    CACHE_LOOKUPS.inc(len(misses), result="miss")
+    if misses:
+        for i, raw in zip(misses, predict_fn([decoded[i][1] for i in misses])):
+            raws[i] = raw
+            detection_cache.put(decoded[i][0], raw)
+    return raws, misses
 
-    img_area = img_rgb.shape[0] * img_rgb.shape[1]
+def predict_raw(model, imgs: List[np.ndarray], imgsz: int = 640) -> List[RawDetections]:
+    BATCH_SIZES.observe(len(imgs))
+    with STAGE_SECONDS.time(stage="predict"):
+        results = model.predict(imgs, imgsz=imgsz, verbose=False, conf=CACHE_MIN_CONF)
+    return [boxes_to_arrays(r) for r in results]
+
+def predict_tiled(model, imgs: List[np.ndarray], tiling: Tuple[int, int], conf_threshold: float) -> List[RawDetections]:
+    # Tiles are predicted at CACHE_MIN_CONF like everything else, but merged at the
+    # requested confidence: NMS over every low-confidence box of a large image is slow
+    tile_size, overlap = tiling
+    return [
+        detect_tiled(
+            img, lambda tiles: predict_raw(model, tiles, imgsz=tile_size), tile_size, overlap, TILE_BATCH_SIZE,
+            conf_threshold=conf_threshold,
+        )
+        for img in imgs
+    ]
+
+def process_yolo(
+    image_bytes: Buffer,
+    conf_threshold: float,
+    tiling: Optional[Tuple[int, int]] = None,
+    model_name: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    model = model_registry.get(model_name)
+    key, img_rgb = decode_keyed(image_bytes, model_name, tiling, conf_threshold)
+    if tiling:
+        predict_fn = lambda imgs: predict_tiled(model, imgs, tiling, conf_threshold)
+    else:
+        predict_fn = lambda imgs: predict_raw(model, imgs)
+    (raw,), _ = detect_cached([(key, img_rgb)], predict_fn)
+    return postprocess_detections(raw, img_rgb.shape, conf_threshold, model.names), img_rgb
+
+@timed(STAGE_SECONDS, stage="filter")
+def postprocess_detections(
+    raw: RawDetections,
+    img_shape: Tuple[int, ...],
+    conf_threshold: float,
+    class_names: Dict[int, str],
+) -> List[Dict[str, Any]]:
+    img_area = img_shape[0] * img_shape[1]
     max_area = img_area * 0.15  # caveat: max 33% of image area
 
-    # --- First pass: gather all areas ---
-    raw_detections = []
-    for box, conf, cls_id in zip(results.boxes.xyxy, results.boxes.conf, results.boxes.cls):
-        x1, y1, x2, y2 = map(int, box)
-        width, height = x2 - x1, y2 - y1
-        area = width * height
-        raw_detections.append((x1, y1, x2, y2, width, height, area, float(conf), int(cls_id)))
-
-    if not raw_detections:
-        return [], img_rgb
-
-    # --- Compute mean + stddev of areas ---
-    areas = [d[6] for d in raw_detections]
-    mean_area = np.mean(areas)
-    std_area = np.std(areas)
-    area_cutoff = mean_area + 2 * std_area
-
-    # --- Second pass: filter ---
-    for (x1, y1, x2, y2, width, height, area, conf, cls_id) in raw_detections:
-        if area > max_area:  # absolute max 33% rule
-            continue
-        if area > area_cutoff:  # outlier rule
-            continue
-        detections.append({
-            "bbox": [x1, y1, x2, y2],
-            "confidence": conf,
-            "label": CLASS_NAMES[cls_id],
-            "center_x": int((x1 + x2) / 2),
-            "center_y": int((y1 + y2) / 2),
-            "width": width,
-            "height": height,
-            "area": area,
-        })
-
-    return detections, img_rgb
+    # --- Confidence filter (strict, in float32, like the model's own NMS) ---
+    keep = raw["conf"] > np.float32(conf_threshold)
+    if not keep.any():
+        return []
+
+    # --- Integer boxes and areas (astype truncates like int()) ---
+    x1, y1, x2, y2 = raw["xyxy"][keep].astype(np.int64).T
+    conf = raw["conf"][keep]
+    cls_ids = raw["cls"][keep]
+    width, height = x2 - x1, y2 - y1
+    area = width * height
+
+    # --- Absolute max-area cap and mean + 2 stddev outlier cutoff ---
+    area_cutoff = np.mean(area) + 2 * np.std(area)
+    keep = (area <= max_area) & (area <= area_cutoff)
+    if not keep.any():
+        return []
+
+    # --- Build output records only for the survivors ---
+    center_x = ((x1 + x2) / 2).astype(np.int64)
+    center_y = ((y1 + y2) / 2).astype(np.int64)
+    columns = np.stack([x1, y1, x2, y2, center_x, center_y, width, height, area], axis=1)[keep]
+    return [
+        {
+            "bbox": [bx1, by1, bx2, by2],
+            "confidence": c,
+            "label": class_names[k],
+            "center_x": cx,
+            "center_y": cy,
+            "width": w,
+            "height": h,
+            "area": a,
+        }
+        for (bx1, by1, bx2, by2, cx, cy, w, h, a), c, k in zip(columns.tolist(), conf[keep].tolist(), cls_ids[keep].tolist())
+    ]
+
+
+# --------- Reference Matching ---------
+def add_reference(name: str, image_bytes: Buffer) -> Dict[str, Any]:
+    return reference_index.add(name, decode_image(image_bytes), image_bytes)
+
+def add_request_references(references: List[Tuple[str, Buffer]]) -> None:
+    # References sent along with a request are added to the index once (keyed by content hash)
+    for name, data in references:
+        try:
+            add_reference(name, data)
+        except ValueError as e:
+            app.logger.warning("skipping reference %s: %s", name, e)
+
+def maybe_embed(img: np.ndarray) -> Optional[np.ndarray]:
+    return embed(img) if len(reference_index) else None
+
+def match_references(embeddings: List[Optional[np.ndarray]]) -> List[Optional[Dict[str, Any]]]:
+    # One matrix product for the whole batch; images embedded before the index had entries get None
+    rows = [i for i, e in enumerate(embeddings) if e is not None]
+    matches: List[Optional[Dict[str, Any]]] = [None] * len(embeddings)
+    if rows:
+        for i, match in zip(rows, reference_index.match(np.stack([embeddings[i] for i in rows]))):
+            matches[i] = match
+    return matches
 
 
 # --------- Core Processing ---------
-def process_single_image(image_bytes: bytes, params: Dict[str, Any], reference_bytes: List[Tuple[str, bytes]]) -> Dict[str, Any]:
+def process_single_image(image_bytes: Buffer, params: Dict[str, Any], reference_bytes: List[Tuple[str, Buffer]]) -> Dict[str, Any]:
     conf_threshold = float(params.get("confidence", 0.25))  # slider value from frontend
-    detections, img_rgb = process_yolo(image_bytes, conf_threshold)
-    annotated = annotate_image_yolo(img_rgb, detections)
-    annotated_b64 = pil_to_base64(annotated)
+    output = params.get("output") or DEFAULT_OUTPUT
+    add_request_references(reference_bytes)
+    detections, img_rgb = process_yolo(image_bytes, conf_threshold, params.get("tiling"), params.get("model"))
+    (reference_match,) = match_references([maybe_embed(img_rgb)])
+    annotated_b64 = None
+    if output.renders_image:
+        annotated = encode_pool.submit(profiled(render_annotated), img_rgb, detections, output).result()
+        annotated_b64 = base64.b64encode(annotated).decode("utf-8")
     return {
         "detections": detections,
         "annotated_image_base64": annotated_b64,
+        "annotated_image_mime": output.mime,
+        "reference_match": reference_match,
+    }
+
+def form_flag(form, name: str) -> bool:
+    return str(form.get(name, "")).lower() in ("1", "true", "on", "yes")
+
+def parse_tiling(form) -> Optional[Tuple[int, int]]:
+    if not form_flag(form, "tiled"):
+        return None
+    try:
+        tile_size = max(64, int(form.get("tile_size", TILE_SIZE)))
+        overlap = min(max(0, int(form.get("tile_overlap", TILE_OVERLAP))), tile_size // 2)
+    except ValueError:
+        raise BadRequest("tile_size and tile_overlap must be whole numbers")
+    return tile_size, overlap
+
+def parse_batch_size(form) -> int:
+    try:
+        batch_size = int(form.get("batch_size", BATCH_SIZE))
+    except ValueError:
+        raise BadRequest("batch_size must be a whole number")
+    if batch_size < 1:
+        raise BadRequest("batch_size must be at least 1")
+    return batch_size
+
+def parse_model(form) -> str:
+    return model_registry.resolve(form.get("model") or None)
+
+def parse_output(form) -> OutputFormat:
+    try:
+        return OutputFormat(
+            format=(form.get("output_format") or DEFAULT_OUTPUT.format).lower(),
+            quality=int(form.get("quality", DEFAULT_OUTPUT.quality)),
+            max_side=max(0, int(form.get("max_side", DEFAULT_OUTPUT.max_side))),
+        )
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+def stored_output(params: Dict[str, Any]) -> OutputFormat:
+    # Jobs from before output formats existed were rendered as full-size PNG
+    return OutputFormat(**params.get("output") or {})
+
+def make_batch_pipeline(
+    conf_threshold: float,
+    batch_size: int,
+    tiling: Optional[Tuple[int, int]] = None,
+    model_name: Optional[str] = None,
+    output: OutputFormat = DEFAULT_OUTPUT,
+) -> PlatePipeline:
+    model = model_registry.get(model_name)
+    engine = BatchInferenceEngine(model, batch_size=batch_size)
+
+    def infer(decoded):
+        timing = {"size": 0, "seconds": 0.0, "seconds_per_image": 0.0}
+
+        def predict(imgs):
+            if tiling:
+                # Tiles are batched inside each image instead of across images
+                start = time.perf_counter()
+                raws = predict_tiled(model, imgs, tiling, conf_threshold)
+                elapsed = time.perf_counter() - start
+                timing.update(size=len(imgs), seconds=round(elapsed, 4), seconds_per_image=round(elapsed / len(imgs), 4))
+                return raws
+            results, t = engine.predict_batch(imgs, CACHE_MIN_CONF)
+            timing.update(t)
+            BATCH_SIZES.observe(t["size"])
+            STAGE_SECONDS.observe(t["seconds"], stage="predict")
+            return [boxes_to_arrays(r) for r in results]
+
+        raws, misses = detect_cached(decoded, predict)
+        timing["cache_hits"] = len(decoded) - len(misses)
+        return list(zip(raws, match_references([d[2] for d in decoded]))), timing
+
+    def decode(image):
+        # Uploads are closed as soon as they are decoded, so at most the
+        # images in flight are held in memory, not the whole request
+        if isinstance(image, Upload):
+            try:
+                key, img = decode_keyed(image.data, model_name, tiling, conf_threshold)
+            finally:
+                image.close()
+        else:
+            key, img = decode_keyed(image, model_name, tiling, conf_threshold)
+        return key, img, maybe_embed(img)
+
+    pipeline = PlatePipeline(
+        decode_fn=profiled(decode),
+        infer_fn=profiled(infer),
+        post_fn=profiled(lambda decoded, out: postprocess_detections(out[0], decoded[1].shape, conf_threshold, model.names)),
+        render_fn=profiled(lambda decoded, dets: render_annotated(decoded[1], dets, output)),
+        info_fn=lambda decoded, out: {"reference_match": out[1]} if out[1] else {},
+        batch_size=batch_size,
+        decode_workers=DECODE_WORKERS,
+        render_workers=RENDER_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+    active_pipelines.add(pipeline)
+    return pipeline
+
+def result_row(result: PipelineResult) -> Dict[str, Any]:
+    if result.error is not None:
+        return {
+            "image_name": result.name,
+            "error": result.error,
+            "detections": []
+        }
+    return {
+        "image_name": result.name,
+        "total_features": len(result.detections),
+        "detections": result.detections,
+        **result.info
     }
 
+def open_ingest() -> MultipartIngest:
+    # Reads request.stream directly; request.form / request.files must not be touched
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        raise BadRequest("Expected a multipart/form-data upload")
+    return MultipartIngest(request.stream, boundary.encode("latin-1"), memory_limit=UPLOAD_MEMORY_LIMIT)
+
+def start_batch(ingest: MultipartIngest) -> Tuple[CombinedMultiDict, Optional[Iterator[Upload]]]:
+    # Images go to the pipeline while later ones are still uploading once the
+    # parameters are known: from the query string, or form fields sent before
+    # the first image. Otherwise the whole body is read first so trailing
+    # fields still apply. Returns no images if the upload had none. Reference
+    # files in the body are added to the index as they arrive. Every upload
+    # is closed once used: images by the pipeline's decode stage, the rest here.
+    files = ingest.files()
+    ready: List[Upload] = []
+    params_known = any(name in request.args for name in PARAM_FIELDS)
+    for upload in files:
+        ready.append(upload)
+        if upload.field == "images" and (params_known or ingest.fields):
+            break
+    form = CombinedMultiDict([request.args, ingest.fields.copy()])
+    if not any(upload.field == "images" for upload in ready):
+        return form, None
+
+    def uploads():
+        # Popped so nothing here keeps an upload alive once the pipeline is done with it
+        while ready:
+            yield ready.pop(0)
+        yield from files
+
+    def images():
+        for upload in uploads():
+            if upload.field == "images":
+                yield upload
+                continue
+            try:
+                if upload.field == "references":
+                    add_request_references([(upload.filename, upload.data)])
+            finally:
+                upload.close()
+    return form, images()
+
+def run_job(items, params: Dict[str, Any]):
+    tiling = tuple(params["tiling"]) if params.get("tiling") else None
+    pipeline = make_batch_pipeline(
+        float(params["confidence"]), int(params["batch_size"]), tiling, params.get("model"), stored_output(params)
+    )
+    for result in pipeline.run(items):
+        yield result_row(result), result.annotated
+
+def write_job_tables(job_dir: str, rows: List[Dict[str, Any]]) -> None:
+    if not PARQUET_AVAILABLE:
+        return
+    with ResultTables(os.path.join(job_dir, "detections.parquet"), os.path.join(job_dir, "images.parquet")) as tables:
+        for row in rows:
+            tables.add(row["index"], row)
+
+job_manager = JobManager(
+    JOBS_DIR, run_job, CSV_COLUMNS, workers=JOB_WORKERS, finish_fn=write_job_tables, retention=JOB_RETENTION
+)
+
+# Pipelines drop out of this set once their request or job lets go of them
+active_pipelines: "weakref.WeakSet[PlatePipeline]" = weakref.WeakSet()
+
+def queue_depths() -> Dict[Tuple[str, ...], float]:
+    depths = {
+        ("decode",): 0.0,
+        ("render",): 0.0,
+        ("jobs",): float(job_manager.status_counts().get("queued", 0)),
+        ("admission",): float(inference_limiter.waiting),
+    }
+    for pipeline in list(active_pipelines):
+        for name, depth in pipeline.queue_depths().items():
+            depths[(name,)] += depth
+    return depths
+
+metrics.gauge("pt9_queue_depth", "Items waiting in pipeline stage queues, and queued jobs", ["queue"], fn=queue_depths)
+
+# --------- Request Hooks ---------
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    g.profiler = None
+    IN_PROGRESS.inc()
+    if PROFILE_DIR and (PROFILE_SLOW_MS or request.args.get("profile") == "1"):
+        g.profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000.0, threading.get_ident()).start()
+
+@app.after_request
+def record_status(response):
+    g.status = response.status_code
+    if response.is_streamed and "start" in g:
+        # The body is generated after the view returns; finish once the server has sent all of it
+        finish = run_once(functools.partial(
+            finish_request, g.pop("start"), request.endpoint or "unmatched", str(response.status_code),
+            g.profiler, request.args.get("profile") == "1", request.path,
+        ))
+        response.call_on_close(finish)
+        if response.direct_passthrough:
+            # Werkzeug hands send_file bodies to the server as they are, without its close callbacks
+            response.response = ClosingIterator(response.response, finish)
+    return response
+
+@app.teardown_request
+def end_request(exc):
+    # Streamed responses were handed to call_on_close, and tear down twice (before and after the body)
+    start = g.pop("start", None)
+    if start is None:
+        return
+    finish_request(start, request.endpoint or "unmatched", str(g.get("status", 500)),
+                   g.profiler, request.args.get("profile") == "1", request.path)
+
+def run_once(fn):
+    # A passed-through body can be closed both directly and through the response
+    called = []
+    def wrapper():
+        if not called:
+            called.append(True)
+            fn()
+    return wrapper
+
+def profiled(fn):
+    # Pool and pipeline threads running fn are sampled by the request's profiler, if it has one
+    profiler = g.get("profiler") if has_request_context() else None
+    return profiler.attach(fn) if profiler is not None else fn
+
+def profiled_iter(items):
+    # The pipeline reads its input (the upload still arriving) on a feeder thread
+    profiler = g.get("profiler") if has_request_context() else None
+    return profiler.attach_iter(items) if profiler is not None else items
+
+def finish_request(start: float, endpoint: str, status: str, profiler: Optional[SamplingProfiler],
+                   profile_requested: bool, path: str) -> None:
+    elapsed = time.perf_counter() - start
+    IN_PROGRESS.dec()
+    REQUESTS.inc(endpoint=endpoint, status=status)
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+
+    if profiler is not None:
+        profiler.stop()
+        if profile_requested or elapsed * 1000 >= PROFILE_SLOW_MS:
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed * 1000)}ms.folded"
+            dumped = profiler.dump(os.path.join(PROFILE_DIR, name))
+            app.logger.info("profile for %s written to %s", path, dumped)
+
+def service_busy(reason: str):
+    REJECTED.inc(reason=reason)
+    return jsonify({"error": "Server busy, please retry shortly"}), 503, {"Retry-After": "1"}
+
+def limit_inference(view):
+    # Holds an inference slot for the whole response, including a streamed body
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not inference_limiter.acquire():
+            return service_busy("inference")
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            inference_limiter.release()
+            raise
+        if response.is_streamed:
+            response.call_on_close(inference_limiter.release)
+        else:
+            inference_limiter.release()
+        return response
+    return wrapper
+
 # --------- Routes ---------
+@app.errorhandler(UnknownModelError)
+def unknown_model(e):
+    return jsonify({"error": e.args[0]}), 400
+
 @app.route("/")
 def root():
     return send_from_directory(app.static_folder, "index.html")
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/models")
+def api_models():
+    return jsonify({"default": model_registry.default, "models": model_registry.describe()})
+
 @app.post("/api/process")
+@limit_inference
 def api_process():
-    if "image" not in request.files:
-        return jsonify({"error": "Missing image"}), 400
+    ingest = open_ingest()
+    try:
+        uploads = ingest.read_all()
+        form = CombinedMultiDict([request.args, ingest.fields])
+        image = next((u for u in uploads if u.field == "image"), None)
+        if image is None:
+            return jsonify({"error": "Missing image"}), 400
 
-    image_file = request.files["image"]
-    conf_threshold = request.form.get("confidence", 0.25)  # slider value
+        conf_threshold = form.get("confidence", 0.25)  # slider value
+        references: List[Tuple[str, Buffer]] = [(u.filename, u.data) for u in uploads if u.field == "references"]
 
-    ref_files = request.files.getlist("references")
-    references: List[Tuple[str, bytes]] = [(rf.filename, rf.read()) for rf in ref_files]
-
-    out = process_single_image(image_file.read(), {"confidence": conf_threshold}, references)
+        params = {
+            "confidence": conf_threshold,
+            "tiling": parse_tiling(form),
+            "model": parse_model(form),
+            "output": parse_output(form),
+        }
+        out = process_single_image(image.data, params, references)
+    finally:
+        ingest.close()
     return jsonify(out)
 
 @app.post("/api/batch")
+@limit_inference
 def api_batch():
-    files = request.files.getlist("images")
-    if not files:
-        return jsonify({"error": "No images uploaded"}), 400
+    ingest = open_ingest()
+    try:
+        form, images = start_batch(ingest)
+        if images is None:
+            return jsonify({"error": "No images uploaded"}), 400
 
-    conf_threshold = request.form.get("confidence", 0.25)
-    ref_files = request.files.getlist("references")
-    references: List[Tuple[str, bytes]] = [(rf.filename, rf.read()) for rf in ref_files]
+        conf_threshold = form.get("confidence", 0.25)
+        batch_size = parse_batch_size(form)
+        pipeline = make_batch_pipeline(
+            float(conf_threshold), batch_size, parse_tiling(form), parse_model(form), parse_output(form)
+        )
 
-    rows = []
-    zip_buf = io.BytesIO()
-    with zipfile.ZipFile(zip_buf, "w") as zf:
-        for f in files:
-            try:
-                result = process_single_image(f.read(), {"confidence": conf_threshold}, references)
-                total = len(result["detections"])
-                rows.append({
-                    "image_name": f.filename,
-                    "total_features": total,
-                    "detections": result["detections"]
-                })
-                img_data = base64.b64decode(result["annotated_image_base64"])
-                zf.writestr(f.filename.replace(" ", "_"), img_data)
-            except Exception as e:
-                rows.append({
-                    "image_name": f.filename,
-                    "error": str(e),
-                    "detections": []
-                })
+        rows = []
+        zip_buf = io.BytesIO()
+        with zipfile.ZipFile(zip_buf, "w") as zf:
+            for result in pipeline.run(profiled_iter((u.filename, u) for u in images)):
+                rows.append(result_row(result))
+                if result.annotated is not None:
+                    zf.writestr(result.name.replace(" ", "_"), result.annotated)
+    finally:
+        ingest.close()
 
     zip_buf.seek(0)
     csv_df = pd.DataFrame(rows)
@@ -154,9 +673,218 @@ def api_batch():
     return jsonify({
         "results": rows,
         "csv_base64": csv_b64,
-        "zip_base64": zip_b64
+        "zip_base64": zip_b64,
+        "batch_timings": pipeline.batch_timings
     })
 
+@app.post("/api/batch/zip")
+@limit_inference
+def api_batch_zip():
+    ingest = open_ingest()
+    try:
+        form, images = start_batch(ingest)
+        if images is None:
+            ingest.close()
+            return jsonify({"error": "No images uploaded"}), 400
+
+        conf_threshold = float(form.get("confidence", 0.25))
+        batch_size = parse_batch_size(form)
+        pipeline = make_batch_pipeline(conf_threshold, batch_size, parse_tiling(form), parse_model(form), parse_output(form))
+        with_parquet = form_flag(form, "parquet")
+        if with_parquet and not PARQUET_AVAILABLE:
+            raise BadRequest("Parquet export needs pyarrow installed on the server")
+    except BaseException:
+        ingest.close()
+        raise
+
+    def members():
+        # CSV rows (and Parquet record batches) are spooled as they come in and added as the last members
+        pending: List[Tuple[str, int]] = []
+        tables = None
+
+        def held_members():
+            # One image at a time back out of the spool, which is then emptied for reuse
+            held.seek(0)
+            for name, size in pending:
+                yield name, held.read(size)
+            pending.clear()
+            held.seek(0)
+            held.truncate()
+
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as csv_buf, \
+                    tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as held, \
+                    tempfile.TemporaryFile() as det_buf, tempfile.TemporaryFile() as img_buf:
+                if with_parquet:
+                    tables = ResultTables(det_buf, img_buf)
+                text = io.TextIOWrapper(csv_buf, encoding="utf-8", newline="", write_through=True)
+                writer = csv.DictWriter(text, fieldnames=CSV_COLUMNS)
+                writer.writeheader()
+                for result in pipeline.run(profiled_iter((u.filename, u) for u in images)):
+                    row = result_row(result)
+                    writer.writerow(row)
+                    if tables is not None:
+                        tables.add(result.index, row)
+                    if result.annotated is not None:
+                        pending.append((result.name.replace(" ", "_"), len(result.annotated)))
+                        held.write(result.annotated)
+                    # Hold output back until the upload is fully read: not every
+                    # client reads the response while it is still sending the body.
+                    # Images finished before that wait on disk, not in memory.
+                    if ingest.complete:
+                        yield from held_members()
+                yield from held_members()
+                text.detach()
+                csv_buf.seek(0)
+                yield "results.csv", csv_buf
+                if tables is not None:
+                    tables.close()
+                    det_buf.seek(0)
+                    img_buf.seek(0)
+                    yield "detections.parquet", det_buf
+                    yield "images.parquet", img_buf
+        finally:
+            ingest.close()
+
+    return Response(
+        stream_with_context(stream_zip(members())),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=plate_results.zip"},
+    )
+
+@app.post("/api/sequence")
+@limit_inference
+def api_sequence():
+    ingest = open_ingest()
+    try:
+        uploads = ingest.read_all()
+        form = CombinedMultiDict([request.args, ingest.fields])
+        upload = next((u for u in uploads if u.field == "sequence"), None)
+        if upload is None:
+            return jsonify({"error": "Missing video or frame archive"}), 400
+
+        try:
+            conf_threshold = float(form.get("confidence", 0.25))
+            gate = ChangeGate(
+                float(form.get("diff_threshold", SEQUENCE_DIFF_THRESHOLD)),
+                int(form.get("max_skip", SEQUENCE_MAX_SKIP)),
+            )
+            fps = float(form.get("fps", 0))  # frame archives only; videos carry their own timestamps
+        except ValueError as e:
+            raise BadRequest(str(e))
+        batch_size = parse_batch_size(form)
+        tiling = parse_tiling(form)
+        model = model_registry.get(parse_model(form))
+
+        def count(imgs):
+            raws = predict_tiled(model, imgs, tiling, conf_threshold) if tiling else predict_raw(model, imgs)
+            return [len(postprocess_detections(raw, img.shape, conf_threshold, model.names)) for raw, img in zip(raws, imgs)]
+
+        # OpenCV needs a path; the upload is already on disk past UPLOAD_MEMORY_LIMIT,
+        # and frames are decoded one at a time from there
+        suffix = os.path.splitext(upload.filename or "")[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+            tmp.write(upload.data)
+            tmp.flush()
+            upload.close()
+            try:
+                frames = open_frames(tmp.name, fps)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            series = list(count_series(frames, count, gate, batch_size))
+    finally:
+        ingest.close()
+    return jsonify({"series": series, "summary": summarize(series)})
+
+@app.post("/api/jobs")
+def api_jobs_submit():
+    files = request.files.getlist("images")
+    if not files:
+        return jsonify({"error": "No images uploaded"}), 400
+    if MAX_QUEUED_JOBS and job_manager.status_counts().get("queued", 0) >= MAX_QUEUED_JOBS:
+        return service_busy("jobs")
+
+    params = {
+        "confidence": float(request.form.get("confidence", 0.25)),
+        "batch_size": parse_batch_size(request.form),
+        "tiling": parse_tiling(request.form),
+        "model": parse_model(request.form),
+        "output": asdict(parse_output(request.form)),
+    }
+    add_request_references([(rf.filename, rf.read()) for rf in request.files.getlist("references")])
+    job_id = job_manager.submit([(f.filename, f.stream) for f in files], params)
+    return jsonify({"job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+@app.get("/api/references")
+def api_references_list():
+    return jsonify({"references": reference_index.list_references()})
+
+@app.post("/api/references")
+def api_references_add():
+    files = request.files.getlist("references")
+    if not files:
+        return jsonify({"error": "No references uploaded"}), 400
+
+    added, errors = [], []
+    for f in files:
+        try:
+            added.append(add_reference(f.filename, f.read()))
+        except ValueError as e:
+            errors.append({"name": f.filename, "error": str(e)})
+    return jsonify({"references": added, "errors": errors}), 201 if added else 400
+
+@app.delete("/api/references/<ref_id>")
+def api_references_delete(ref_id):
+    if not reference_index.remove(ref_id):
+        return jsonify({"error": "Unknown reference"}), 404
+    return "", 204
+
+@app.get("/api/jobs")
+def api_jobs_list():
+    return jsonify({"jobs": job_manager.list_jobs()})
+
+@app.get("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    # Pass ?since=<n> to only receive rows finished after the first n
+    since = request.args.get("since", 0, type=int)
+    job.pop("inputs", None)
+    has_images = stored_output(job["params"]).renders_image
+    job["results"] = [
+        dict(row, annotated_url=f"/api/jobs/{job_id}/images/{row['index']}") if has_images and row.get("error") is None else row
+        for row in job_manager.results(job_id, since)
+    ]
+    if job["status"] == "done":
+        job["csv_url"] = f"/api/jobs/{job_id}/results.csv"
+        job["zip_url"] = f"/api/jobs/{job_id}/annotated.zip"
+        if job_manager.artifact_path(job_id, "detections.parquet"):
+            job["detections_parquet_url"] = f"/api/jobs/{job_id}/detections.parquet"
+            job["images_parquet_url"] = f"/api/jobs/{job_id}/images.parquet"
+    return jsonify(job)
+
+@app.get("/api/jobs/<job_id>/images/<int:index>")
+def api_job_image(job_id, index):
+    path = job_manager.annotated_path(job_id, index)
+    if path is None:
+        return jsonify({"error": "Image not ready"}), 404
+    return send_file(path, mimetype=stored_output(job_manager.get(job_id)["params"]).mime)
+
+@app.get("/api/jobs/<job_id>/<any('results.csv', 'annotated.zip', 'detections.parquet', 'images.parquet'):artifact>")
+def api_job_artifact(job_id, artifact):
+    path = job_manager.artifact_path(job_id, artifact)
+    if path is None:
+        job = job_manager.get(job_id)
+        if job is not None and job["status"] == "done":
+            return jsonify({"error": f"{artifact} was not written for this job"}), 404
+        return jsonify({"error": "Job not finished"}), 409
+    return send_file(path, as_attachment=True, download_name=artifact)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
+    # The debug reloader imports this module twice; only the serving child resumes jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_manager.resume()
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,164 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+DESCRIPTOR = "hsv-hist-16x4x4"
+EMBED_SIDE = 256
+THUMB_SIDE = 512
+
+
+def _resize_max(img: np.ndarray, side: int) -> np.ndarray:
+    scale = side / max(img.shape[:2])
+    if scale >= 1.0:
+        return img
+    size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def embed(img_rgb: np.ndarray) -> np.ndarray:
+    # Colour histogram in HSV, square-rooted (Hellinger) and L2-normalised, so a
+    # dot product between two embeddings is their cosine similarity
+    hsv = cv2.cvtColor(_resize_max(img_rgb, EMBED_SIDE), cv2.COLOR_RGB2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, [16, 4, 4], [0, 180, 0, 256, 0, 256]).ravel()
+    hist = np.sqrt(hist / max(float(hist.sum()), 1.0))
+    return (hist / max(float(np.linalg.norm(hist)), 1e-12)).astype(np.float32)
+
+
+# --------- Reference Index ---------
+class ReferenceIndex:
+    """Persistent index of reference plates and their embeddings.
+
+    Stored under ``root`` as::
+
+        embeddings.npy      float32 (N, D), one row per reference
+        references.json     id, name and creation time per row, plus the descriptor name
+        thumbs/<id>.jpg     downscaled copy, used to re-embed if the descriptor changes
+
+    References are keyed by a hash of the uploaded bytes, so adding the same
+    file again is a no-op. The index is reloaded when another process changes it.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._mtime: Optional[int] = None
+        os.makedirs(os.path.join(root, "thumbs"), exist_ok=True)
+        self._reload()
+
+    def __len__(self) -> int:
+        self._reload()
+        return len(self._entries)
+
+    # --- Public API ---
+    def add(self, name: str, img_rgb: np.ndarray, image_bytes) -> Dict[str, Any]:
+        ref_id = hashlib.sha256(image_bytes).hexdigest()[:16]
+        with self._writing():
+            for entry in self._entries:
+                if entry["id"] == ref_id:
+                    return dict(entry)
+            # Embedded from the thumbnail, which is also what a re-embed would start from
+            thumb = _resize_max(img_rgb, THUMB_SIDE)
+            cv2.imwrite(self._thumb_path(ref_id), cv2.cvtColor(thumb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+            entry = {"id": ref_id, "name": name, "created": time.time()}
+            vector = embed(thumb)[None]
+            embeddings = np.concatenate([self._embeddings, vector]) if len(self._entries) else vector
+            self._save(self._entries + [entry], embeddings)
+            return dict(entry)
+
+    def remove(self, ref_id: str) -> bool:
+        with self._writing():
+            keep = [i for i, entry in enumerate(self._entries) if entry["id"] != ref_id]
+            if len(keep) == len(self._entries):
+                return False
+            self._save([self._entries[i] for i in keep], self._embeddings[keep])
+            try:
+                os.remove(self._thumb_path(ref_id))
+            except OSError:
+                pass
+            return True
+
+    def list_references(self) -> List[Dict[str, Any]]:
+        self._reload()
+        with self._lock:
+            return [dict(entry) for entry in self._entries]
+
+    def match(self, embeddings: np.ndarray) -> List[Optional[Dict[str, Any]]]:
+        """Nearest reference and its cosine similarity for each row of ``embeddings``."""
+        self._reload()
+        with self._lock:
+            entries, refs = self._entries, self._embeddings
+        if not entries or not len(embeddings):
+            return [None] * len(embeddings)
+        sims = embeddings @ refs.T
+        best = sims.argmax(axis=1)
+        return [
+            {"id": entries[j]["id"], "name": entries[j]["name"], "similarity": round(float(sims[i, j]), 4)}
+            for i, j in enumerate(best.tolist())
+        ]
+
+    # --- Storage ---
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        # Serialises writers across threads and worker processes sharing ``root``
+        with self._lock, open(os.path.join(self.root, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._reload_locked()
+            yield
+
+    def _thumb_path(self, ref_id: str) -> str:
+        return os.path.join(self.root, "thumbs", ref_id + ".jpg")
+
+    def _save(self, entries: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        # Embeddings first, then the metadata that other processes watch for changes
+        emb_path = os.path.join(self.root, "embeddings.npy")
+        with open(emb_path + ".tmp", "wb") as f:
+            np.save(f, embeddings)
+        os.replace(emb_path + ".tmp", emb_path)
+        meta_path = os.path.join(self.root, "references.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"descriptor": DESCRIPTOR, "references": entries}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._entries, self._embeddings = entries, embeddings
+        self._mtime = os.stat(meta_path).st_mtime_ns
+
+    def _reload(self) -> None:
+        with self._lock:
+            self._reload_locked()
+
+    def _reload_locked(self) -> None:
+        meta_path = os.path.join(self.root, "references.json")
+        try:
+            mtime = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        entries = meta["references"]
+        if meta.get("descriptor") != DESCRIPTOR:
+            embeddings = self._reembed(entries)
+            self._save(entries, embeddings)
+            return
+        embeddings = np.load(os.path.join(self.root, "embeddings.npy"))
+        if len(embeddings) != len(entries):
+            # Caught between another process's two writes; pick it up next time
+            return
+        self._entries, self._embeddings, self._mtime = entries, embeddings, mtime
+
+    def _reembed(self, entries: List[Dict[str, Any]]) -> np.ndarray:
+        rows = []
+        for entry in entries:
+            thumb = cv2.imread(self._thumb_path(entry["id"]), cv2.IMREAD_COLOR)
+            rows.append(embed(cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)))
+        return np.stack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
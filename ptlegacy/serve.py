@@ -0,0 +1,164 @@
+"""Production server for the plate counter: gunicorn with preforked workers.
+
+    WORKERS=4 THREADS_PER_WORKER=2 python serve.py
+
+The app and the default model's weights are loaded once in the master and
+the workers are forked from it, so the weights are shared copy-on-write.
+Each worker pins torch / OpenMP / BLAS / OpenCV to THREADS_PER_WORKER threads
+(default: cores / workers) so they don't oversubscribe the CPU.
+
+The model is not run in the master: OpenMP thread pools don't survive a fork,
+so every worker does its own warm-up inference after forking. For the same
+reason MODEL_BACKEND=onnx skips the preload, and each worker builds its own
+ONNX Runtime session.
+
+Every worker has its own /metrics, detection cache and admission limits
+(MAX_INFERENCE_REQUESTS, MAX_WAITING_REQUESTS, see pt9.py). A request only
+reaches the limiter once one of the worker's WORKER_THREADS picks it up;
+gthread parks the rest unseen. So the waiting limit is derived from the
+thread count, leaving one thread free to answer 503 once every slot and
+waiting place is taken, and a configuration that could never shed load is
+refused. Background jobs run in the worker that accepted them; one worker
+also resumes interrupted jobs.
+"""
+import fcntl
+import gc
+import multiprocessing
+import os
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+BIND = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+WORKERS = int(os.environ.get("WORKERS", 2))
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", 8))
+THREADS_PER_WORKER = int(os.environ.get("THREADS_PER_WORKER", 0)) or max(1, multiprocessing.cpu_count() // max(1, WORKERS))
+TIMEOUT = int(os.environ.get("TIMEOUT", 300))
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 60))
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS", "VECLIB_MAXIMUM_THREADS")
+
+
+# --------- Admission Limits ---------
+def admission_limits(threads: int, max_active: int, max_waiting: Optional[int] = None) -> Tuple[int, int]:
+    """(max_active, max_waiting) for a worker with ``threads`` request threads.
+
+    ``max_waiting`` defaults to every thread not running inference but one;
+    a larger value, or no thread left over, means the limiter could never
+    turn a request away, so it's an error.
+    """
+    if max_active <= 0:
+        return max_active, max_waiting or 0
+    room = threads - max_active - 1
+    if room < 0:
+        raise ValueError(f"WORKER_THREADS={threads} must be above MAX_INFERENCE_REQUESTS={max_active}")
+    if max_waiting is None:
+        return max_active, room
+    if max_waiting > room:
+        raise ValueError(
+            f"MAX_WAITING_REQUESTS={max_waiting} is never reached with WORKER_THREADS={threads} and "
+            f"MAX_INFERENCE_REQUESTS={max_active}; it can be at most {room}"
+        )
+    return max_active, max_waiting
+
+
+def configure_admission() -> None:
+    # pt9 reads these at import time
+    waiting = os.environ.get("MAX_WAITING_REQUESTS")
+    max_active, max_waiting = admission_limits(
+        WORKER_THREADS,
+        int(os.environ.get("MAX_INFERENCE_REQUESTS", 2)),
+        int(waiting) if waiting else None,
+    )
+    os.environ["MAX_INFERENCE_REQUESTS"] = str(max_active)
+    os.environ["MAX_WAITING_REQUESTS"] = str(max_waiting)
+
+
+# --------- Worker Setup ---------
+def pin_threads(n: int) -> None:
+    # Env vars only take effect if set before numpy / torch are imported
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(n))
+    os.environ.setdefault("ONNX_INTRA_OP_THREADS", str(n))
+    if "cv2" in sys.modules:
+        sys.modules["cv2"].setNumThreads(n)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(n)
+
+
+def load_app():
+    pin_threads(THREADS_PER_WORKER)
+    configure_admission()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import pt9
+
+    if pt9.MODEL_BACKEND != "onnx":
+        pt9.model_registry.get(warmup=False)
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # the workers don't write to (and so un-share) those pages
+    gc.collect()
+    gc.freeze()
+    return pt9.app
+
+
+def post_fork(server, worker) -> None:
+    pin_threads(THREADS_PER_WORKER)
+
+
+def post_worker_init(worker) -> None:
+    import pt9
+
+    pt9.model_registry.warmup()
+    # The first worker to take the lock resumes interrupted jobs and keeps the lock
+    # until it exits; a replacement worker then picks it up
+    lock = open(os.path.join(pt9.JOBS_DIR, ".resume.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return
+    worker.resume_lock = lock
+    pt9.job_manager.resume()
+
+
+def worker_exit(server, worker) -> None:
+    import pt9
+
+    pt9.job_manager.shutdown()
+
+
+# --------- Gunicorn Application ---------
+def gunicorn_options() -> Dict[str, Any]:
+    return {
+        "bind": BIND,
+        "workers": WORKERS,
+        "worker_class": "gthread",
+        "threads": WORKER_THREADS,
+        "preload_app": True,
+        "timeout": TIMEOUT,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+        "worker_exit": worker_exit,
+    }
+
+
+def main(options: Optional[Dict[str, Any]] = None) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class PlateServer(BaseApplication):
+        def __init__(self, options: Dict[str, Any]):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app()
+
+    PlateServer(dict(gunicorn_options(), **(options or {}))).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from boxes import batched_nms
+from detection_cache import RawDetections
+
+MAX_CANDIDATES = 30000  # highest-scoring merged boxes that go into NMS, as ultralytics caps it
+
+
+# --------- Tiled Inference ---------
+def tile_grid(height: int, width: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """Return ``(x, y, w, h)`` tiles covering the image, overlapping by ``overlap`` px."""
+    if not 0 <= overlap < tile_size:
+        raise ValueError("tile overlap must be in [0, tile_size)")
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        stride = tile_size - overlap
+        out = list(range(0, length - tile_size + 1, stride))
+        if out[-1] != length - tile_size:
+            out.append(length - tile_size)
+        return out
+
+    return [
+        (x, y, min(tile_size, width - x), min(tile_size, height - y))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def detect_tiled(
+    img: np.ndarray,
+    predict_fn: Callable[[List[np.ndarray]], List[RawDetections]],
+    tile_size: int = 640,
+    overlap: int = 128,
+    batch_size: int = 8,
+    iou_threshold: float = 0.5,
+    conf_threshold: float = 0.0,
+    max_candidates: int = MAX_CANDIDATES,
+) -> RawDetections:
+    """Run ``predict_fn`` over overlapping tiles and merge boxes into image coordinates.
+
+    Tiles are views into ``img`` and are sent to the model ``batch_size`` at a
+    time, so memory beyond the decoded image stays bounded by one batch of
+    tiles. A box touching a tile edge that lies inside the image is dropped
+    when it is narrower than the overlap, because the neighbouring tile sees
+    the whole object; cross-tile duplicates are then removed with class-aware
+    NMS. Only boxes above ``conf_threshold`` (strict, as the post-processing
+    filter is) and at most the ``max_candidates`` best of them reach NMS;
+    boxes below the threshold can't suppress anything above it, so the
+    result is the same as filtering afterwards.
+    """
+    height, width = img.shape[:2]
+    tiles = tile_grid(height, width, tile_size, overlap)
+    all_xyxy, all_conf, all_cls = [], [], []
+
+    for start in range(0, len(tiles), batch_size):
+        chunk = tiles[start:start + batch_size]
+        raws = predict_fn([img[y:y + h, x:x + w] for x, y, w, h in chunk])
+        for (x, y, w, h), raw in zip(chunk, raws):
+            xyxy = raw["xyxy"].astype(np.float32)
+            bw = xyxy[:, 2] - xyxy[:, 0]
+            bh = xyxy[:, 3] - xyxy[:, 1]
+            cut = np.zeros(len(xyxy), dtype=bool)
+            if x > 0:
+                cut |= (xyxy[:, 0] <= 1) & (bw < overlap)
+            if y > 0:
+                cut |= (xyxy[:, 1] <= 1) & (bh < overlap)
+            if x + w < width:
+                cut |= (xyxy[:, 2] >= w - 1) & (bw < overlap)
+            if y + h < height:
+                cut |= (xyxy[:, 3] >= h - 1) & (bh < overlap)
+            keep = ~cut
+            all_xyxy.append(xyxy[keep] + np.array([x, y, x, y], dtype=np.float32))
+            all_conf.append(raw["conf"][keep].astype(np.float32))
+            all_cls.append(raw["cls"][keep].astype(np.int64))
+
+    xyxy = np.concatenate(all_xyxy) if all_xyxy else np.zeros((0, 4), np.float32)
+    conf = np.concatenate(all_conf) if all_conf else np.zeros(0, np.float32)
+    cls = np.concatenate(all_cls) if all_cls else np.zeros(0, np.int64)
+    keep = np.flatnonzero(conf > np.float32(conf_threshold))
+    if len(keep) > max_candidates:
+        keep = keep[np.argpartition(-conf[keep], max_candidates)[:max_candidates]]
+    xyxy, conf, cls = xyxy[keep], conf[keep], cls[keep]
+    keep = batched_nms(xyxy, conf, cls, iou_threshold)
+    return {"xyxy": xyxy[keep], "conf": conf[keep], "cls": cls[keep]}
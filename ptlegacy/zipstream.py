@@ -0,0 +1,50 @@
+import io
+import zipfile
+from typing import BinaryIO, Iterable, Iterator, Tuple, Union
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, unseekable target: ZipFile falls back to data descriptors,
+    # so each member can be handed to the client as soon as it is written.
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(members: Iterable[Tuple[str, Union[bytes, BinaryIO]]]) -> Iterator[bytes]:
+    """Yield a ZIP archive chunk by chunk.
+
+    ``members`` yields ``(arcname, data)`` pairs where ``data`` is either bytes
+    or a readable binary file object, which is copied in ``CHUNK_SIZE`` pieces.
+    Only the member currently being written is ever buffered.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for arcname, data in members:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                zf.writestr(arcname, data)
+            else:
+                with zf.open(arcname, "w", force_zip64=True) as dest:
+                    for chunk in iter(lambda: data.read(CHUNK_SIZE), b""):
+                        dest.write(chunk)
+                        out = sink.drain()
+                        if out:
+                            yield out
+            out = sink.drain()
+            if out:
+                yield out
+    yield sink.drain()
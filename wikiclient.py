@@ -0,0 +1,178 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Wikimedia asks for a descriptive User-Agent with contact details; set WIKI_USER_AGENT to include yours
+USER_AGENT = os.environ.get("WIKI_USER_AGENT", "NamingGames/1.0 (Streamlit naming challenge) python-requests/" + requests.__version__)
+MAX_PER_HOST = int(os.environ.get("WIKI_MAX_PER_HOST", 4))  # concurrent requests per host
+RATE = float(os.environ.get("WIKI_RATE", 10))  # requests per second per host
+BURST = int(os.environ.get("WIKI_BURST", 10))
+RETRIES = int(os.environ.get("WIKI_RETRIES", 4))
+# Sent to the MediaWiki action API (api.php); replicas lagging more than this answer with a maxlag error
+MAXLAG = int(os.environ.get("WIKI_MAXLAG", 5))
+TIMEOUT = (5, 30)  # connect, read
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average, with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Call:
+    # One in-flight fetch that identical concurrent requests wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[requests.Response] = None
+        self.error: Optional[BaseException] = None
+
+
+# --------- Wiki Client ---------
+class WikiClient:
+    """Shared HTTP client for the Wikipedia / Wikidata / WDQS endpoints.
+
+    One pooled keep-alive ``Session`` for the whole process. Each host gets
+    a concurrency limit and a token bucket. 429s, 5xx, maxlag errors and
+    connection failures are retried with jittered exponential backoff,
+    honouring Retry-After. Identical GETs made concurrently share a single
+    fetch and its response. ``get`` returns the ``requests.Response`` like
+    ``requests.get`` does; a response that is still failing after the last
+    retry is returned as is.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = MAX_PER_HOST,
+        rate: float = RATE,
+        burst: int = BURST,
+        retries: int = RETRIES,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        maxlag: int = MAXLAG,
+        timeout: Tuple[float, float] = TIMEOUT,
+    ):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.maxlag = maxlag
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(max_per_host, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Tuple[threading.BoundedSemaphore, TokenBucket]] = {}
+        self._inflight: Dict[Any, _Call] = {}
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+    ) -> requests.Response:
+        params = dict(params or {})
+        if self.maxlag and urlsplit(url).path.endswith("/api.php"):
+            params.setdefault("maxlag", self.maxlag)
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items())), tuple(sorted((headers or {}).items())))
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self._fetch(url, params, headers, timeout or self.timeout)
+            return call.response
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    # --- Internals ---
+    def _host(self, url: str) -> Tuple[threading.BoundedSemaphore, TokenBucket]:
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.max_per_host), TokenBucket(self.rate, self.burst))
+            return self._hosts[host]
+
+    def _delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        # Full jitter: anywhere up to the exponential cap, so clients that failed together spread out
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _fetch(
+        self, url: str, params: Dict[str, Any], headers: Optional[Dict[str, str]], timeout: Tuple[float, float]
+    ) -> requests.Response:
+        limit, bucket = self._host(url)
+        attempt = 0
+        while True:
+            response = None
+            bucket.acquire()
+            try:
+                with limit:
+                    response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            else:
+                retry = (
+                    response.status_code == 429
+                    or response.status_code >= 500
+                    or response.headers.get("MediaWiki-API-Error") == "maxlag"
+                )
+                if not retry or attempt >= self.retries:
+                    return response
+            time.sleep(self._delay(attempt, response))
+            attempt += 1
+
+
+client = WikiClient()
+
+
+def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[Tuple[float, float]] = None,
+) -> requests.Response:
+    """Drop-in for ``requests.get`` through the process-wide client."""
+    return client.get(url, params=params, headers=headers, timeout=timeout)